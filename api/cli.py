@@ -1,30 +1,272 @@
 import json
 import os
 import sys
+import threading
 import traceback
+from datetime import datetime, timedelta
+from itertools import islice
 
 import bcrypt
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
 
-from config import MONGO_DB
-from common_utils import logger, gen_random_string,config_db
+from config import MONGO_DB, TZ
+from common_utils import logger, gen_random_string, config_db, replace_tz
 from model.config_model import ConfigDao
 from model.feed_model import FeedDao
 from model.oauth_model import UserDao
+from model.transaction_model import TransactionRollupDao
 from tools.feed_tool import RuleSetTool, SecurityFeedTool
+from tools.network_tool import NetworkTool
 from tools.ssl_tool import SSLTool
 from config import APP_BASE
 
 APP_CONFIG_DIR = os.path.join(APP_BASE, "admin/config")
 
-def update_schema():
+INDEX_OPTIONS = ["unique", "sparse", "expireAfterSeconds", "partialFilterExpression"]
+
+def index_keys(keys):
+    """Key list with numeric directions as int, the server may return 1.0 for 1."""
+    return [(k, int(v) if isinstance(v, (int, float)) else v) for k, v in keys]
+
+def index_spec(index):
+    """Key list, name and options of a mongo-schema.json index entry.
+
+    Entries without 'keys' are a single ascending field named by 'name' and
+    keep the default Mongo index name, as created by earlier schema versions.
+    """
+    if "keys" in index:
+        keys = index_keys(index["keys"].items())
+        name = index["name"]
+    else:
+        keys = [(index["name"], 1)]
+        name = f"{index['name']}_1"
+    options = {o: index[o] for o in INDEX_OPTIONS if o in index}
+    return keys, name, options
+
+def sync_indexes(db_collection, indexes):
+    """Reconcile the indexes of a collection with its schema, idempotently.
+
+    Missing indexes are created, the ones whose options changed are rebuilt
+    and the ones no longer in the schema are dropped.
+    """
+    existing = db_collection.index_information()
+    wanted = [index_spec(i) for i in indexes if i["name"] != "_id"]
+    keep = {"_id_"}
+    for keys, name, options in wanted:
+        current = next((n for n, i in existing.items() if index_keys(i["key"]) == keys), None)
+        if current and {o: existing[current][o] for o in INDEX_OPTIONS if o in existing[current]} == options:
+            keep.add(current)
+            continue
+        dropped = []
+        for stale in {current, name} & set(existing):
+            db_collection.drop_index(stale)
+            dropped.append((stale, existing.pop(stale)))
+            logger.info(f"Dropped index {db_collection.name}.{stale} to rebuild {name}")
+        try:
+            db_collection.create_index(keys, name=name, **options)
+        except OperationFailure as e:
+            # e.g. duplicates against a new unique option, keep serving with the previous index
+            logger.error(f"Failed to create index {db_collection.name}.{name}, restoring the previous one: {e}")
+            for stale, info in dropped:
+                db_collection.create_index(
+                    index_keys(info["key"]), name=stale, **{o: info[o] for o in INDEX_OPTIONS if o in info}
+                )
+                keep.add(stale)
+            continue
+        keep.add(name)
+        logger.info(f"Created index {db_collection.name}.{name}")
+    for stale in set(existing) - keep:
+        db_collection.drop_index(stale)
+        logger.info(f"Dropped index {db_collection.name}.{stale}, not in schema")
+
+def copy_timeseries(source, target, collection, batch_size=1000):
+    """Copy the documents of a plain collection into its time-series replacement, then drop it.
+
+    Documents past the time-series expiry are left out, the source is kept
+    if the copy fails.
+    """
+    query = {}
+    if 'expireAfterSeconds' in collection:
+        dt_start = datetime.now(TZ) - timedelta(seconds=collection['expireAfterSeconds'])
+        query = {collection['timeseries']['timeField']: {"$gte": dt_start}}
+    total = 0
+    try:
+        rows = source.find(query, {"_id": 0})
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            total += len(target.insert_many(chunk, ordered=False).inserted_ids)
+        source.drop()
+        logger.info(f"Copied {total} documents of {source.name} into {target.name} and dropped it")
+    except Exception as e:
+        logger.error(f"Failed to copy {source.name} into {target.name}, kept for a manual copy: {e}")
+
+def update_schema(names=None):
+    """Create the collections and indexes of mongo-schema.json.
+
+    Args:
+        names: Only these collections, all of them when None
+    """
     with open("config/mongo-schema.json", "r") as file:
         schema = json.load(file)
         database = getattr(config_db,schema['database'])
+        existing = {c['name']: c.get('type') for c in database.list_collections()}
         for collection in schema['collections']:
+            if names is not None and collection['name'] not in names:
+                continue
+            legacy = None
+            if 'timeseries' in collection and existing.get(collection['name']) not in [None, 'timeseries']:
+                # auto-created by a write before the schema update, it would never expire
+                legacy = f"{collection['name']}_legacy_{datetime.now(TZ):%Y%m%d%H%M%S}"
+                database[collection['name']].rename(legacy)
+                existing.pop(collection['name'])
+                logger.warning(f"Renamed plain collection {collection['name']} to {legacy}, recreating it as time-series")
+            if 'timeseries' in collection and collection['name'] not in existing:
+                options = {'timeseries': collection['timeseries']}
+                if 'expireAfterSeconds' in collection:
+                    options['expireAfterSeconds'] = collection['expireAfterSeconds']
+                database.create_collection(collection['name'], **options)
+            if legacy:
+                copy_timeseries(database[legacy], database[collection['name']], collection)
             db_collection = database[collection['name']]
             if 'indexes' in collection:
-                for index in collection['indexes']:
-                    db_collection.create_index(index['name'])
+                sync_indexes(db_collection, collection['indexes'])
+
+def migrate_ip_keys(batch_size=1000):
+    """Convert net_start/net_end stored as padded strings to NetworkTool.id keys."""
+    for name in ["rbl", "geoip"]:
+        collection = config_db[MONGO_DB][name]
+        rows = collection.find({"net_start": {"$type": "string"}}, {"net_start": 1, "net_end": 1})
+        ops = []
+        total = 0
+        for r in rows:
+            try:
+                ops.append(UpdateOne({"_id": r["_id"]}, {"$set": {
+                    "net_start": NetworkTool.id_from_legacy(r["net_start"]),
+                    "net_end": NetworkTool.id_from_legacy(r["net_end"]),
+                }}))
+            except ValueError as e:
+                logger.error(f"Failed to migrate {name} {r['_id']}: {e}")
+            if len(ops) >= batch_size:
+                total += collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            total += collection.bulk_write(ops, ordered=False).modified_count
+        if total:
+            logger.info(f"Migrated {total} {name} ranges to numeric keys")
+
+def migrate_jail_expiry():
+    """Set expire_on on jail bans stored before the rbl TTL index."""
+    rbl = config_db[MONGO_DB]["rbl"]
+    for jail in config_db[MONGO_DB]["jail"].find({}, {"bantime": 1}):
+        rs = rbl.update_many(
+            {"provider_type": "jail", "provider_id": jail["_id"], "expire_on": {"$exists": False}},
+            [{"$set": {"expire_on": {"$add": ["$banned_on", int(jail.get("bantime", 0)) * 60000]}}}],
+        )
+        if rs.modified_count:
+            logger.info(f"Migrated {rs.modified_count} bans of jail {jail['_id']} to TTL expiry")
+
+def migrate_rollups():
+    """Build the per-minute rollups from the stored summaries and transactions, once.
+
+    Only the last 30 days are read, older rollups would be dropped by the
+    TTL index right away. The backfill stops before the first minute the
+    live rollups wrote, its $merge replaces the counters it matches. That
+    bound is kept with the migration marker, so a retry covers the same
+    minutes.
+    """
+    db = config_db[MONGO_DB]
+    migration = db["migration"].find_one({"_id": "rollups"})
+    if migration and "done_on" in migration:
+        return
+    # $merge on the rollup key needs its unique index
+    update_schema(["transaction_rollup"])
+    if migration:
+        dt_end = migration["dt_end"]
+    else:
+        dt_end = datetime.now(TZ).replace(second=0, microsecond=0)
+        first = db["transaction_rollup"].find_one({}, {"minute": 1}, sort=[("minute", 1)])
+        if first:
+            dt_end = min(dt_end, replace_tz(first["minute"]))
+        db["migration"].insert_one({"_id": "rollups", "dt_end": dt_end})
+    window = {"$match": {"logtime": {"$gte": dt_end - timedelta(days=30), "$lt": dt_end}}}
+
+    def key(server_id, service_id):
+        return {
+            "minute": {"$dateTrunc": {"date": "$logtime", "unit": "minute"}},
+            "server_id": server_id,
+            "service_id": {"$ifNull": [service_id, ""]},
+            "route_name": {"$ifNull": ["$route_name", ""]},
+            "action": "$action",
+        }
+
+    merge = {"$merge": {
+        "into": "transaction_rollup",
+        "on": ["minute"] + TransactionRollupDao.KEY,
+        "whenMatched": "merge",
+        "whenNotMatched": "insert",
+    }}
+    latency, lower = {}, None
+    for upper in TransactionRollupDao.LATENCY_BUCKETS + [None]:
+        bounds = []
+        if lower is not None:
+            bounds.append({"$gt": ["$duration", lower]})
+        if upper is not None:
+            bounds.append({"$lte": ["$duration", upper]})
+        latency[TransactionRollupDao.bucket(upper if upper is not None else float("inf"))] = {
+            "$sum": {"$cond": [{"$and": bounds}, 1, 0]}
+        }
+        lower = upper
+    db["transaction_summary"].aggregate([
+        window,
+        {"$group": dict(
+            {
+                "_id": key("$meta.server_id", "$meta.service_id"),
+                "count": {"$sum": 1},
+                "bytes_in": {"$sum": "$bytes_in"},
+                "bytes_out": {"$sum": "$bytes_out"},
+                "duration_sum": {"$sum": "$duration"},
+            },
+            **latency,
+        )},
+        {"$replaceWith": {"$mergeObjects": [
+            "$_id",
+            {"count": "$count", "bytes_in": "$bytes_in", "bytes_out": "$bytes_out", "duration_sum": "$duration_sum"},
+            {"latency": {name: f"${name}" for name in latency}},
+        ]}},
+        merge,
+    ])
+    db["transaction"].aggregate([
+        window,
+        {"$group": {"_id": key("$server_id", "$service_id"), "trn_count": {"$sum": 1}}},
+        {"$replaceWith": {"$mergeObjects": ["$_id", {"trn_count": "$trn_count"}]}},
+        merge,
+    ])
+    db["migration"].update_one({"_id": "rollups"}, {"$set": {"done_on": datetime.now(TZ)}})
+    logger.info(f"Built {db['transaction_rollup'].estimated_document_count()} transaction rollups")
+
+def migrate(background=False):
+    """Run the data migrations.
+
+    Args:
+        background: Run the long backfills in a thread, as done at startup
+    """
+    # startup only runs migrate(): the TTL index on expire_on drops expired jail bans,
+    # transaction_summary must exist as time-series before the first write
+    update_schema(["rbl", "transaction_summary"])
+    migrate_ip_keys()
+    migrate_jail_expiry()
+    if background:
+        def run():
+            try:
+                migrate_rollups()
+            except Exception as e:
+                logger.error(f"Failed to build transaction rollups: {e}")
+        threading.Thread(target=run, name="migrate-rollups", daemon=True).start()
+    else:
+        migrate_rollups()
 
 def initialize_db():
     logger.info("Initialize DB")
@@ -69,6 +311,7 @@ def install():
 
 def update():
     update_schema()
+    migrate()
     feed_dao = FeedDao()
     for arq_name in os.listdir(APP_CONFIG_DIR):
         feed = None
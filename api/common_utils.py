@@ -9,8 +9,10 @@ import shutil
 import socket
 import string
 import threading
+import time
 import traceback
 import zipfile
+from collections import OrderedDict
 from copy import deepcopy
 from datetime import datetime, timedelta
 from functools import wraps
@@ -124,6 +126,17 @@ def get_pagination():
     return _pagination
 
 
+def get_cursor_pagination():
+    """Keyset pagination args, used when a cursor or a size without page is given."""
+    if "cursor" not in request.args and ("size" not in request.args or "page" in request.args):
+        return None
+    return {
+        "per_page": int(request.args.get("size", 10)),
+        "cursor": request.args.get("cursor") or None,
+        "count": request.args.get("count", "false").lower() == "true",
+    }
+
+
 def json_serial(obj):
     if isinstance(obj, datetime):
         return obj.isoformat()
@@ -368,14 +381,114 @@ class ResponseBuilder:
 
 
 class LogCache:
+    """
+    Pending log records of a service waiting to be merged.
+
+    Access and audit records are kept by unique_id in arrival order, so
+    each audit record finds its access record in O(1) and records that
+    never get a match are evicted after a bounded TTL.
+    """
+
     def __init__(self):
         self.lock = threading.Lock()
-        self.audit_log = []
-        self.access_log = []
+        self.audit_log = OrderedDict()
+        self.access_log = OrderedDict()
+        self.access_summary = []
         self.error_log = []
 
+    def add_access(self, record):
+        self.access_log[record["unique_id"]] = (time.monotonic(), record)
+        self.access_summary.append(record)
+
+    def add_audit(self, record):
+        self.audit_log[record["unique_id"]] = (time.monotonic(), record)
+
+    def pop_matches(self):
+        """Remove and return the (access, audit) record pairs sharing a unique_id."""
+        matches = []
+        for unique_id in [u for u in self.audit_log if u in self.access_log]:
+            _, audit = self.audit_log.pop(unique_id)
+            _, access = self.access_log.pop(unique_id)
+            matches.append((access, audit))
+        return matches
+
+    @classmethod
+    def _expire(cls, records, ttl):
+        expired = []
+        limit = time.monotonic() - ttl
+        while records:
+            unique_id, (ts, record) = next(iter(records.items()))
+            if ts > limit:
+                break
+            records.popitem(last=False)
+            expired.append(record)
+        return expired
+
+    def expire(self, ttl):
+        """Evict records older than ttl seconds, returning the expired access records."""
+        self._expire(self.audit_log, ttl)
+        return self._expire(self.access_log, ttl)
+
+
+class LRUCache:
+    """
+    Bounded least recently used mapping with hit/miss counters.
+
+    With a ttl (seconds) entries older than ttl are treated as misses.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    _MISSING = object()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (entry[0] is None or entry[0] > now):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        return default
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        deadline = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (deadline, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_set(self, key, loader):
+        """Return the cached value of key, calling loader(key) to fill a miss."""
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = loader(key)
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
 
 class PageMetaSchema(Schema):
-    total_elements = fields.Integer()
+    total_elements = fields.Integer(allow_none=True)
     page = fields.Integer()
     per_page = fields.Integer()
+    next = fields.String(allow_none=True)
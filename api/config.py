@@ -11,6 +11,23 @@ DATETIME_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
 TZ = pytz.timezone("UTC")
 
 TELEMETRY_INTERVAL = int(os.environ.get("TELEMETRY_INTERVAL", "60")) # in transaction merge (10 minutes)
+LOG_MERGE_TTL = int(os.environ.get("LOG_MERGE_TTL", "120")) # seconds an unmatched access/audit record is kept
+LOG_MERGE_INTERVAL = int(os.environ.get("LOG_MERGE_INTERVAL", "10")) # seconds between access/audit merges
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "1000")) # pending batches between ingestion stages
+LOG_PARSE_WORKERS = int(os.environ.get("LOG_PARSE_WORKERS", "0")) # parse processes, 0 parses in the pipeline thread
+UA_CACHE_SIZE = int(os.environ.get("UA_CACHE_SIZE", "2048")) # parsed user agents kept in memory, 0 disables
+GEOIP_CACHE_SIZE = int(os.environ.get("GEOIP_CACHE_SIZE", "8192")) # resolved addresses kept in memory
+GEOIP_CACHE_TTL = int(os.environ.get("GEOIP_CACHE_TTL", "600")) # seconds a resolved address is reused
+DESCR_CACHE_SIZE = int(os.environ.get("DESCR_CACHE_SIZE", "1024")) # _id/name descriptors kept per collection, 0 disables
+DESCR_CACHE_TTL = int(os.environ.get("DESCR_CACHE_TTL", "300")) # seconds a descriptor is reused without a tracked change
+GEOIP_CHECK_INTERVAL = int(os.environ.get("GEOIP_CHECK_INTERVAL", "60")) # seconds between ip2asn/mmdb change checks
+FEED_DOWNLOAD_WORKERS = int(os.environ.get("FEED_DOWNLOAD_WORKERS", "4")) # concurrent feed/geoip downloads
+FEED_DOWNLOAD_TIMEOUT = int(os.environ.get("FEED_DOWNLOAD_TIMEOUT", "60")) # seconds without data before a download fails
+RBL_MERGED_VIEWS = os.environ.get("RBL_MERGED_VIEWS", "1") == "1" # merge the providers of a sensor into one lookup table
+RBL_BATCH_SIZE = int(os.environ.get("RBL_BATCH_SIZE", "5000")) # feed ranges per insert_many
+GEOIP_BATCH_SIZE = int(os.environ.get("GEOIP_BATCH_SIZE", "5000")) # ip2asn rows per insert_many
+TRN_BATCH_SIZE = int(os.environ.get("TRN_BATCH_SIZE", "500")) # transactions per insert_many
+TRN_COUNT_TTL = int(os.environ.get("TRN_COUNT_TTL", "60")) # seconds a transaction search count is reused
 MAINTENANCE_WINDOW = "01:00"
 
 # Config database (MongoDB)
@@ -35,6 +35,7 @@ def after(response: Response) -> Response:
         dao = ChangeDao()
         if not dao.get_by_name("certificate"):
             dao.persist({"name": "certificate"})
+        dao.invalidate_descr()
         socketio.emit('tracking_evt')
     return response
 
@@ -10,15 +10,19 @@ from common_utils import (
 )
 from model.config_model import ChangeDao, ConfigDao
 from model.rbl_model import RBLDao
-from model.transaction_model import TransactionDao
+from model.transaction_model import TransactionRollupDao
 from model.upstream_model import NodeStatusDao, NodeStatusSchema
 from tools.acme_tool import AcmeTool
 from tools.cluster_tool import ClusterTool
 from tools.feed_tool import SecurityFeedTool
 from tools.mongo_tool import MongoTool
+from tools.network_tool import NetworkTool
 
 routes = Blueprint("cluster", __name__)
 
+VERDICT_MAX_IPS = 1000
+UNTRACKED_ENDPOINTS = ["cluster.verdict"]
+
 
 @routes.after_request
 def after(response: Response) -> Response:
@@ -31,10 +35,15 @@ def after(response: Response) -> Response:
     Returns:
         Response: The modified response object
     """
-    if request.method in ["PUT", "POST", "DELETE"] and response.status_code in [200, 201]:
+    if (
+        request.method in ["PUT", "POST", "DELETE"]
+        and response.status_code in [200, 201]
+        and request.endpoint not in UNTRACKED_ENDPOINTS
+    ):
         dao = ChangeDao()
         if not dao.get_by_name("config"):
             dao.persist({"name": "config"})
+        dao.invalidate_descr()
         socketio.emit("tracking_evt")
     return response
 
@@ -61,6 +70,7 @@ def restore() -> Response:
             dao = ChangeDao()
             if not dao.get_by_name("backup"):
                 dao.persist({"name": "backup"})
+            dao.invalidate_descr()
             return ResponseBuilder.ok("ok")
         except Exception as e:
             return ResponseBuilder.error_500("Failed processing restore", str(e))
@@ -90,10 +100,10 @@ def get_node_status() -> Response:
         Response: JSON response containing node status information or 404 error
     """
     dao = NodeStatusDao()
-    trn_dao = TransactionDao()
     result = dao.get_all()
 
     if result["metadata"]["total_elements"] > 0:
+        bandwidth = TransactionRollupDao().get_nodes_bandwidth([node["name"] for node in result["data"]])
         for node in result["data"]:
             if node["upstreams"]:
                 node["healthy"] = True
@@ -105,10 +115,10 @@ def get_node_status() -> Response:
                             break
             else:
                 node["healthy"] = False
-            telemetry = trn_dao.get_node_bandwidth(node["name"])
+            telemetry = bandwidth.get(node["name"], {})
             node.update({
-                "net_recv": telemetry[0]["net_recv"] if telemetry else 0,
-                "net_send": telemetry[0]["net_send"] if telemetry else 0
+                "net_recv": telemetry.get("net_recv", 0),
+                "net_send": telemetry.get("net_send", 0)
             })
         return ResponseBuilder.data(result, dao.pageSchema)
     return ResponseBuilder.error_404()
@@ -233,3 +243,45 @@ def rbl_status(ipaddr: str, sensor_id: str) -> Response:
             return ResponseBuilder.data(rbl_result)
     
     return ResponseBuilder.error_500("Failed checking RBL")
+
+
+@routes.route("/verdict", methods=["POST"])
+@has_any_authority(_internal=True)
+def verdict() -> Response:
+    """
+    Resolve RBL status and GeoIP country for a batch of IP addresses.
+    
+    Expects a JSON body with 'sensor_id' and the 'ips' list to check.
+    
+    Returns:
+        Response: JSON list with 'ip', 'blocked' and 'country' for each address or error response
+    """
+    if not ClusterTool.CONFIG:
+        return ResponseBuilder.error_500("System not ready")
+
+    req = request.json or {}
+    ips = (req.get("ips") or []) if isinstance(req, dict) else None
+    if not isinstance(ips, list) or not all(isinstance(ip, str) for ip in ips):
+        return ResponseBuilder.error("Expected 'ips' as a list of addresses")
+    if len(ips) > VERDICT_MAX_IPS:
+        return ResponseBuilder.error(f"Too many addresses, limit is {VERDICT_MAX_IPS}")
+    invalid = [ip for ip in ips if not NetworkTool.is_host(ip)]
+    if invalid:
+        return ResponseBuilder.error("Invalid addresses", details=invalid)
+
+    for sensor in ClusterTool.CONFIG["sensors"]:
+        if sensor["_id"] == req.get("sensor_id"):
+            rbl_result = RBLDao().check_by_ips(ips, sensor)
+            geo_result = SecurityFeedTool.geo_info_many(ips)
+            return ResponseBuilder.data(
+                [
+                    {
+                        "ip": ip,
+                        "blocked": rbl_result[ip]["blocked"],
+                        "country": geo_result[ip].get("country"),
+                    }
+                    for ip in ips
+                ]
+            )
+
+    return ResponseBuilder.error_500("Failed checking RBL")
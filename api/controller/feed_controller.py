@@ -1,4 +1,3 @@
-from bson import ObjectId
 from typing import Dict, List, Optional, Union
 
 from flask import Blueprint, request, Response
@@ -14,6 +13,7 @@ from model.config_model import ChangeDao
 from model.feed_model import FeedDao
 from model.rbl_model import RBLDao
 from tools.network_tool import NetworkTool
+from tools.rbl_tool import RBLIndex
 
 routes = Blueprint("feed", __name__)
 
@@ -33,6 +33,7 @@ def after(response: Response) -> Response:
         dao = ChangeDao()
         if not dao.get_by_name("feed"):
             dao.persist({"name": "feed"})
+        dao.invalidate_descr()
         socketio.emit("tracking_evt")
     return response
 
@@ -141,13 +142,12 @@ def __rebuild_feed(feed_dict: Dict) -> None:
         feed_dict: The feed dictionary containing content to process
     """
     rbl_dao = RBLDao()
-    rbl_dao.delete_by_provider("feed", feed_dict["_id"])
-    
-    for content in feed_dict["content"]:
-        rbl = dict(NetworkTool.range_from_network(content))
-        rbl.update({
-            "provider_type": "feed",
-            "provider_id": ObjectId(feed_dict["_id"]),
-            "action": feed_dict["action"],
-        })
-        rbl_dao.persist(rbl)
+    rbl_dao.sync_provider(
+        "feed",
+        feed_dict["_id"],
+        RBLIndex.collapse(
+            dict(NetworkTool.range_from_network(content), action=feed_dict["action"])
+            for content in feed_dict["content"]
+        ),
+    )
+    rbl_dao.load_index(feed_dict["_id"])
@@ -30,6 +30,7 @@ def after(response: Response) -> Response:
         dao = ChangeDao()
         if not dao.get_by_name("jail"):
             dao.persist({"name": "jail"})
+        dao.invalidate_descr()
         socketio.emit("tracking_evt")
     return response
 
@@ -30,6 +30,7 @@ def after(response: Response) -> Response:
         dao = ChangeDao()
         if not dao.get_by_name("route_filter"):
             dao.persist({"name": "route_filter"})
+        dao.invalidate_descr()
         socketio.emit('tracking_evt')
     return response
 
@@ -32,6 +32,7 @@ def after(response: Response) -> Response:
         dao = ChangeDao()
         if not dao.get_by_name("sensor"):
             dao.persist({"name": "sensor"})
+        dao.invalidate_descr()
         socketio.emit("tracking_evt")
     return response
 
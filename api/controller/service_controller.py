@@ -29,6 +29,7 @@ def after(response: Response) -> Response:
         dao = ChangeDao()
         if not dao.get_by_name("service"):
             dao.persist({"name": "service"})
+        dao.invalidate_descr()
         socketio.emit('tracking_evt')
     return response
 
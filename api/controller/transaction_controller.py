@@ -2,7 +2,7 @@ from datetime import datetime
 
 from flask import Blueprint, request
 
-from common_utils import ResponseBuilder, has_any_authority, get_pagination, replace_tz
+from common_utils import ResponseBuilder, has_any_authority, get_cursor_pagination, get_pagination, replace_tz
 from model.transaction_model import TransactionDao
 from config import DATETIME_FMT
 
@@ -60,6 +60,24 @@ def search():
         request.json.pop("logtime_start"), DATETIME_FMT
     ))
     ed_date = replace_tz(datetime.strptime(request.json.pop("logtime_end"), DATETIME_FMT))
+    _cursor = get_cursor_pagination()
+    if _cursor:
+        try:
+            result = dao.get_page(
+                _cursor["per_page"],
+                _cursor["cursor"],
+                dt_start=st_date,
+                dt_end=ed_date,
+                filters=request.json.get("filters") if request.json else None,
+                with_count=_cursor["count"],
+                fields=request.json.get("fields", TransactionDao.LIST_FIELDS) if request.json else TransactionDao.LIST_FIELDS,
+            )
+        except ValueError as e:
+            return ResponseBuilder.error(str(e))
+        if result["data"]:
+            return ResponseBuilder.data(result, dao.pageSchema)
+        else:
+            return ResponseBuilder.error_404()
     _pagination = get_pagination()
     if request.json and "filters" in request.json:
         result = dao.get_all(
@@ -67,6 +85,7 @@ def search():
             dt_start=st_date,
             dt_end=ed_date,
             filters=request.json["filters"],
+            fields=request.json.get("fields", TransactionDao.LIST_FIELDS),
         )
     else:
         result = dao.get_all(
@@ -74,6 +93,7 @@ def search():
             dt_start=st_date,
             dt_end=ed_date,
             filters=None,
+            fields=request.json.get("fields", TransactionDao.LIST_FIELDS) if request.json else TransactionDao.LIST_FIELDS,
         )
     if result["metadata"]["total_elements"] > 0:
         return ResponseBuilder.data(result, dao.pageSchema)
@@ -17,6 +17,7 @@ def after(response):
         dao = ChangeDao()
         if not dao.get_by_name("upstream"):
             dao.persist({"name": "upstream"})
+        dao.invalidate_descr()
         socketio.emit('tracking_evt')
     return response
 
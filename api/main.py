@@ -1,3 +1,4 @@
+import atexit
 import os
 import threading
 import time
@@ -26,15 +27,18 @@ from controller.transaction_controller import routes as trn_routes
 from controller.upstream_controller import routes as upstream_routes
 from controller.user_controller import routes as user_routes
 from model.config_model import ConfigDao
+from model.rbl_model import RBLDao
 from tools.acme_tool import AcmeTool
 from tools.archive_tool import LogArchiverTool
 from tools.cluster_tool import ClusterTool
-from tools.feed_tool import RuleSetTool, JailTool, SecurityFeedTool
-from cli import install
+from tools.feed_tool import RuleSetTool, SecurityFeedTool
+from tools.jail_tool import JailTool
+from cli import install, migrate
 from config import (
     APP_BASE,
     NODE_ROLE,
-    MAINTENANCE_WINDOW
+    MAINTENANCE_WINDOW,
+    GEOIP_CHECK_INTERVAL
 )
 
 app = Flask(__name__)
@@ -141,6 +145,8 @@ with app.app_context():
     if "main" in NODE_ROLE:
         if not config:
             install()
+        else:
+            migrate(background=True)
         config = dao.get_active()
             
         if "cluster_id" not in config:
@@ -154,8 +160,12 @@ with app.app_context():
         schedule.every(10).seconds.do(ClusterTool.auto_apply_config)
     else:
         schedule.every(10).seconds.do(ClusterTool.auto_replicate_config)
+        schedule.every(10).seconds.do(RBLDao().sync_index)
     schedule.every(10).seconds.do(ClusterTool().node_monitor)
-    
+    schedule.every(GEOIP_CHECK_INTERVAL).seconds.do(SecurityFeedTool.geoip.refresh)
+    # first GeoIP load off the startup path, lookups return no data until it is done
+    threading.Thread(target=SecurityFeedTool.geoip.refresh, daemon=True).start()
+
     try:
         ClusterTool.apply_config(reconfigure=True)
         if "main" in NODE_ROLE:
@@ -166,3 +176,5 @@ with app.app_context():
 
     scheduler_thread = threading.Thread(target=_scheduler, daemon=True)
     scheduler_thread.start()
+    # flush the lines already read before the worker exits
+    atexit.register(ClusterTool.stop_log_monitor)
@@ -81,9 +81,7 @@ class FeedDao(MongoDAO):
             PyMongoError: If an error occurs during the search operation
         """
         try:
-            rows = list(self.collection.find({"type": {"$regex": f".*{_type}.*"}}))
-            for e in rows:
-                 self._to_dict(e)
+            rows = self._to_dict_all(list(self.collection.find({"type": {"$regex": f".*{_type}.*"}})))
             return rows
         except Exception as e:
             logger.error(f"Error retrieving feeds by type: {str(e)}")
@@ -1,8 +1,10 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional
+
+from pymongo.errors import PyMongoError
 
 from common_utils import logger
+from config import GEOIP_BATCH_SIZE
 from model.mongo_base_model import MongoDAO
-from tools.network_tool import NetworkTool
 
 
 class GeoIpDao(MongoDAO):
@@ -19,26 +21,73 @@ class GeoIpDao(MongoDAO):
         """
         super().__init__("geoip")
 
+    def get_stamp(self) -> Optional[str]:
+        """
+        Returns a stamp that changes whenever the collection is reloaded.
+
+        Returns:
+            Optional[str]: Id of the newest document or None if empty
+        """
+        rs = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        return str(rs["_id"]) if rs else None
 
-    def find_by_ip(self, ip: str) -> Optional[Dict[str, Any]]:
+    def get_ranges(self):
         """
-        Finds GeoIP information for a given IP address.
+        Returns a cursor over the ranges needed by the in-memory resolver.
+
+        Returns:
+            Cursor: Documents with version, net_start, net_end, as_number, as_description and country_code
+        """
+        return self.collection.find(
+            {},
+            {
+                "_id": 0,
+                "version": 1,
+                "net_start": 1,
+                "net_end": 1,
+                "as_number": 1,
+                "as_description": 1,
+                "country_code": 1,
+            },
+        )
+
+    def import_ranges(self, rows: Iterable[Dict[str, Any]], chunk_size: int = GEOIP_BATCH_SIZE) -> int:
+        """
+        Replaces the collection content through a shadow collection.
+
+        Rows are streamed in chunks into '<collection>_import', which gets
+        the indexes of the live collection and is then renamed over it, so
+        lookups keep the previous data until the import is complete. An
+        empty import or one with failed chunks keeps the live collection.
         
         Args:
-            ip (str): IP address to look up
+            rows (Iterable[Dict[str, Any]]): GeoIP documents, consumed lazily
+            chunk_size (int): Maximum documents per insert_many call
             
         Returns:
-            Optional[Dict[str, Any]]: GeoIP document or None if not found
+            int: Number of documents imported
             
         Raises:
-            PyMongoError: If an error occurs during the search operation
+            PyMongoError: If an error occurs while writing or renaming
         """
+        shadow = MongoDAO(f"{self.collection_name}_import")
+        shadow.collection.drop()
         try:
-            ip_id = NetworkTool.id(ip)
-            query = {"$and": [{"net_start": {"$lte": ip_id}}, {"net_end": {"$gte": ip_id}}]}
-            rs = self.collection.find_one(query)
-            self._to_dict(rs)
-            return rs
+            stats = shadow.insert_chunks(rows, chunk_size)
+            inserted = sum(s["inserted"] for s in stats)
+            failed = sum(s["size"] - s["inserted"] for s in stats)
+            if failed or not inserted:
+                raise PyMongoError(f"{inserted} documents imported, {failed} failed, live collection kept")
+            for name, index in self.collection.index_information().items():
+                if name != "_id_":
+                    options = {
+                        k: v for k, v in index.items()
+                        if k in ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+                    }
+                    shadow.collection.create_index(index["key"], name=name, **options)
+            shadow.collection.rename(self.collection_name, dropTarget=True)
+            return inserted
         except Exception as e:
-            logger.error(f"Error finding GeoIP data for IP {ip}: {str(e)}")
+            logger.error(f"Error importing {self.collection_name}: {str(e)}")
+            shadow.collection.drop()
             raise
@@ -84,9 +84,7 @@ class JailDao(MongoDAO):
         try:
             query = {"type": t}
             logger.debug(query)
-            rows = list(self.collection.find(query))
-            for e in rows:
-                 self._to_dict(e)
+            rows = self._to_dict_all(list(self.collection.find(query)))
             return rows
         except Exception as e:
             logger.error(f"Error retrieving jails by type: {str(e)}")
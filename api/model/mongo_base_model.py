@@ -1,14 +1,16 @@
 import json
 import pickle
-from typing import Any, Dict, List, Optional, Union
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Union
 from datetime import datetime
 
 from bson import ObjectId
 from marshmallow import Schema, fields
-from pymongo.errors import PyMongoError
+from pymongo.errors import BulkWriteError, PyMongoError
 
-from common_utils import logger, config_db
-from config import MONGO_DB
+from common_utils import LRUCache, logger, config_db
+from config import DESCR_CACHE_SIZE, DESCR_CACHE_TTL, MONGO_DB
 
 
 class MongoDAO:
@@ -25,6 +27,8 @@ class MongoDAO:
         collection: MongoDB collection reference
         schema: Marshmallow schema for validation and serialization
     """
+
+    _descr_caches = {}  # collection name -> LRUCache of _id/name descriptors
     
     def __init__(self, collection_name: str, schema: Optional[Schema] = None):
         """
@@ -64,11 +68,70 @@ class MongoDAO:
         if vo and "_id" in vo:
             vo.update({"_id": ObjectId(vo["_id"])})
 
-    def _to_dict(self, vo):
+    def _to_dict(self, vo, refs=None):
         if vo and "_id" in vo:
             vo.update({"_id": str(vo["_id"])})
         return vo
 
+    def _relations(self, vo) -> Iterable[tuple]:
+        """
+        Lists the references of a stored document that _to_dict resolves.
+
+        Subclasses with references override it, yielding a
+        (dao class, full, id) tuple per referenced id, where full asks for
+        the whole document instead of its _id/name description.
+        
+        Args:
+            vo (Dict[str, Any]): Document as stored, before _to_dict
+            
+        Returns:
+            Iterable[tuple]: (dao class, full, id) tuples
+        """
+        return []
+
+    def _load_relations(self, rows: Iterable[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Fetches the references of a result set with one $in query per related DAO.
+        
+        Args:
+            rows (Iterable[Dict[str, Any]]): Documents as stored, before _to_dict
+            
+        Returns:
+            Dict[tuple, Dict[str, Any]]: Loaded documents by id, keyed by (dao class, full)
+        """
+        wanted = {}
+        for vo in rows:
+            if not vo:
+                continue
+            for dao_class, full, _id in self._relations(vo):
+                if _id:
+                    wanted.setdefault((dao_class, full), set()).add(str(_id))
+        refs = {}
+        for (dao_class, full), ids in wanted.items():
+            dao = dao_class()
+            refs[(dao_class, full)] = dao.get_by_ids(ids) if full else dao.get_descr_by_ids(ids)
+        return refs
+
+    @classmethod
+    def _ref(cls, refs, dao_class, _id, full=False):
+        """Referenced document (or description) of _id in refs from _load_relations."""
+        return refs.get((dao_class, full), {}).get(str(_id))
+
+    def _to_dict_all(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Converts a result set with _to_dict, resolving its references in batch.
+        
+        Args:
+            rows (List[Dict[str, Any]]): Documents as stored
+            
+        Returns:
+            List[Dict[str, Any]]: The same documents, converted in place
+        """
+        refs = self._load_relations(rows)
+        for r in rows:
+            self._to_dict(r, refs)
+        return rows
+
     def _fetch_all(self, rs, pagination=None):
         rows = rs.get("data", [])
         if pagination:
@@ -80,8 +143,7 @@ class MongoDAO:
             te = len(rows)
             pagination = {"total_elements": te, "page": 1, "per_page": te}
 
-        for r in rows:
-             self._to_dict(r)
+        self._to_dict_all(rows)
         return dict(
             {
                 "metadata": pagination,
@@ -119,10 +181,75 @@ class MongoDAO:
         rs = list(self.collection.aggregate(query))[0]
         return self._fetch_all(rs, pagination=pagination)
 
+    @property
+    def descr_cache(self) -> LRUCache:
+        return self._descr_caches.setdefault(self.collection_name, LRUCache(DESCR_CACHE_SIZE, DESCR_CACHE_TTL))
+
+    @classmethod
+    def invalidate_descr(cls) -> None:
+        """
+        Drops the cached descriptors of every collection.
+
+        Called by the change tracking after_request hooks and whenever a
+        new SCN is applied, as a rename may be reached from any collection.
+        """
+        for cache in list(cls._descr_caches.values()):
+            cache.clear()
+
     def get_descr_by_id(self, _id):
-        rs = self.collection.find_one({"_id": ObjectId(_id)})
-        if rs and "_id" in rs and "name" in rs:
-            return {"_id": str(rs["_id"]), "name": rs["name"]}
+        cache = self.descr_cache
+        descr = cache.get(str(_id))
+        if descr is None:
+            rs = self.collection.find_one({"_id": ObjectId(_id)}, {"name": 1})
+            if not rs or "name" not in rs:
+                return None
+            descr = {"_id": str(rs["_id"]), "name": rs["name"]}
+            cache.set(descr["_id"], descr)
+        return dict(descr)
+
+    def get_descr_by_ids(self, ids: Iterable[Union[str, ObjectId]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves the _id/name description of several documents in one query.
+
+        Cached descriptors are reused, only the missing ones are queried.
+        
+        Args:
+            ids (Iterable[Union[str, ObjectId]]): Document IDs
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Descriptions by string ID, missing documents are left out
+        """
+        cache = self.descr_cache
+        result, missing = {}, set()
+        for i in {str(i) for i in ids}:
+            descr = cache.get(i)
+            if descr is None:
+                missing.add(ObjectId(i))
+            else:
+                result[i] = dict(descr)
+        if missing:
+            for r in self.collection.find({"_id": {"$in": list(missing)}}, {"name": 1}):
+                if "name" in r:
+                    descr = {"_id": str(r["_id"]), "name": r["name"]}
+                    cache.set(descr["_id"], descr)
+                    result[descr["_id"]] = dict(descr)
+        return result
+
+    def get_by_ids(self, ids: Iterable[Union[str, ObjectId]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves several documents in one query, with their references loaded in batch.
+        
+        Args:
+            ids (Iterable[Union[str, ObjectId]]): Document IDs
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Documents by string ID, missing documents are left out
+        """
+        oids = list({ObjectId(i) for i in ids})
+        if not oids:
+            return {}
+        rows = self._to_dict_all(list(self.collection.find({"_id": {"$in": oids}})))
+        return {r["_id"]: r for r in rows}
 
     def get_by_id(self, _id):
         if isinstance(_id, ObjectId):
@@ -200,6 +327,43 @@ class MongoDAO:
     def persist_many(self, arr):
         return self.collection.insert_many(arr)
 
+    def insert_chunks(self, docs: Iterable[Dict[str, Any]], chunk_size: int) -> List[Dict[str, Any]]:
+        """
+        Inserts documents with unordered insert_many calls of chunk_size documents.
+
+        A failed document does not stop the remaining ones in its chunk.
+        Documents are consumed lazily, so a generator is streamed with at
+        most one chunk in memory.
+        
+        Args:
+            docs (Iterable[Dict[str, Any]]): Documents ready to be stored
+            chunk_size (int): Maximum documents per insert_many call
+            
+        Returns:
+            List[Dict[str, Any]]: Per chunk stats with 'size', 'inserted' and 'latency' (ms)
+        """
+        stats = []
+        docs = iter(docs)
+        while True:
+            chunk = list(islice(docs, chunk_size))
+            if not chunk:
+                break
+            started = time.perf_counter()
+            try:
+                inserted = len(self.collection.insert_many(chunk, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                inserted = e.details.get("nInserted", 0)
+                logger.error(f"Error persisting {self.collection_name}: {e.details.get('writeErrors', [])[:1]}")
+            stats.append(
+                {
+                    "size": len(chunk),
+                    "inserted": inserted,
+                    "latency": round((time.perf_counter() - started) * 1000.0, 2),
+                }
+            )
+        logger.debug(f"Persisted {self.collection_name} batches {stats}")
+        return stats
+
     def delete_by_id(self, _id):
         dr = self.collection.delete_one({"_id": ObjectId(_id)})
         return dr.deleted_count > 0
@@ -1,12 +1,17 @@
-from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Union
 from bson import ObjectId
 from marshmallow import EXCLUDE, Schema, fields
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
 
 from common_utils import logger
-from model.feed_model import FeedSchema
+from config import RBL_BATCH_SIZE, TZ
+from model.feed_model import FeedDao, FeedSchema
+from model.jail_model import JailDao
 from model.mongo_base_model import MongoDAO
 from tools.network_tool import NetworkTool
+from tools.rbl_tool import RBLIndex
 
 
 class RBLSchema(Schema):
@@ -19,8 +24,8 @@ class RBLSchema(Schema):
         unknown = EXCLUDE
 
     _id = fields.String()
-    net_start = fields.String()
-    net_end = fields.String()
+    net_start = fields.Raw()  # int (IPv4) or 16 bytes (IPv6), see NetworkTool.id
+    net_end = fields.Raw()
     network = fields.String()
     version = fields.Integer()
     src_type = fields.String()  # feed, pass_list, jail
@@ -42,9 +47,92 @@ class RBLDao(MongoDAO):
         super().__init__("rbl", schema=FeedSchema)
 
 
+    index = RBLIndex()
+    __RANGE_PROJECTION = {
+        "_id": 0,
+        "net_start": 1,
+        "net_end": 1,
+        "version": 1,
+        "provider_id": 1,
+        "action": 1,
+    }
+
+    def __feed_stamps(self, query: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        rows = FeedDao().collection.find(query or {}, {"updated_on": 1})
+        return {str(r["_id"]): r.get("updated_on") for r in rows}
+
+    def load_index(self, provider_id: Optional[str] = None) -> int:
+        """
+        Builds the in-memory RBL index from the 'rbl' collection.
+
+        Args:
+            provider_id (Optional[str]): Rebuild only this provider, the whole index otherwise
+
+        Returns:
+            int: Number of ranges indexed
+
+        Raises:
+            PyMongoError: If an error occurs while reading the ranges
+        """
+        try:
+            # jail bans past expire_on may still wait for the TTL monitor
+            active = {"expire_on": {"$not": {"$lte": datetime.now(TZ)}}}
+            if provider_id:
+                rows = self.collection.find(
+                    dict(active, provider_id=ObjectId(provider_id)), self.__RANGE_PROJECTION
+                )
+                stamp = self.__feed_stamps({"_id": ObjectId(provider_id)}).get(str(provider_id))
+                return self.index.load_provider(provider_id, rows, stamp)
+            rows = self.collection.find(active, self.__RANGE_PROJECTION)
+            total = self.index.load(rows, self.__feed_stamps())
+            logger.info(f"RBL index loaded with {total} ranges")
+            return total
+        except Exception as e:
+            logger.error(f"Error loading RBL index: {str(e)}")
+            raise
+
+    def sync_index(self) -> None:
+        """
+        Refreshes index entries changed by another node.
+
+        Jail providers are always reloaded, feed providers only when their
+        'updated_on' stamp differs from the one loaded in the index.
+        """
+        if not self.index.ready:
+            self.load_index()
+            return
+        for jail in JailDao().collection.find({}, {"_id": 1}):
+            self.load_index(str(jail["_id"]))
+        for feed_id, stamp in self.__feed_stamps().items():
+            if self.index.stamps.get(feed_id) != stamp:
+                self.load_index(feed_id)
+
+    @classmethod
+    def __sensor_providers(cls, sensor: Dict[str, Any]):
+        bl_providers = set()
+        for sb in sensor.get("block") or []:
+            if sb:
+                bl_providers.add(sb["_id"])
+        # jails change on every ban and stay out of the merged index views
+        jail_providers = set()
+        for sb in sensor.get("jails") or []:
+            if sb:
+                jail_providers.add(sb["_id"])
+
+        per_providers = []
+        if "permit" in sensor:
+            for sb in sensor["permit"]:
+                if sb:
+                    per_providers.append(sb["_id"])
+        return per_providers, bl_providers, jail_providers
+
     def check_by_ip(self, ip: str, sensor: Dict[str, Any]) -> Dict[str, bool]:
         """
         Checks if an IP address is blocked by any RBL providers.
+
+        A match on any 'permit' provider takes precedence over 'block' and
+        'jails' providers. The lookup is served by the in-memory index,
+        which is loaded on first use if not yet built.
         
         Args:
             ip (str): IP address to check
@@ -53,74 +141,42 @@ class RBLDao(MongoDAO):
         Returns:
             Dict[str, bool]: Dictionary with 'blocked' status
             
+        Raises:
+            PyMongoError: If an error occurs during the check operation
+        """
+        return self.check_by_ips([ip], sensor)[ip]
+
+    def check_by_ips(self, ips: List[str], sensor: Dict[str, Any]) -> Dict[str, Dict[str, bool]]:
+        """
+        Checks several IP addresses against the sensor RBL providers.
+        
+        Args:
+            ips (List[str]): IP addresses to check
+            sensor (Dict[str, Any]): Sensor configuration with provider lists
+            
+        Returns:
+            Dict[str, Dict[str, bool]]: Dictionary with 'blocked' status by IP address
+            
         Raises:
             PyMongoError: If an error occurs during the check operation
         """
         try:
-            ip_id = NetworkTool.id(ip)
-
-            bl_providers = []
-            if "block" in sensor:
-                for sb in sensor["block"]:
-                    if sb:
-                        bl_providers.append(ObjectId(sb["_id"]))
-
-            if "jails" in sensor:
-                for sb in sensor["jails"]:
-                    if sb:
-                        bl_providers.append(ObjectId(sb["_id"]))
-
-            per_providers = []
-            if "permit" in sensor:
-                for sb in sensor["permit"]:
-                    if sb:
-                        per_providers.append(ObjectId(sb["_id"]))
-
-            query = [
-                {
-                    "$match": {
-                        "net_start": {"$lte": ip_id},
-                        "net_end": {"$gte": ip_id},
-                        "version": {"$eq": 4 if NetworkTool.is_ipv4(ip) else 6},
-                    }
-                },
-                {
-                    "$facet": {
-                        "pass": [
-                            {
-                                "$match": {
-                                    "action": "pass",
-                                    "provider_id": {"$in": per_providers},
-                                }
-                            }
-                        ],
-                        "deny": [
-                            {
-                                "$match": {
-                                    "action": "deny",
-                                    "provider_id": {"$in": list(set(bl_providers))},
-                                }
-                            }
-                        ],
-                    }
-                },
-                {
-                    "$project": {
-                        "result": {
-                            "$cond": {
-                                "if": {"$gt": [{"$size": "$pass"}, 0]},
-                                "then": [],
-                                "else": "$deny",
-                            }
-                        }
-                    }
-                },
-                {"$unwind": "$result"},
-                {"$replaceRoot": {"newRoot": "$result"}},
-            ]
-            logger.debug(query)
-            rs = list(self.collection.aggregate(query))
-            return {"blocked": (len(rs) > 0)}
+            if not self.index.ready:
+                self.load_index()
+
+            per_providers, bl_providers, jail_providers = self.__sensor_providers(sensor)
+            result = {}
+            for ip in ips:
+                ip_id = NetworkTool.id(ip)
+                blocked = self.index.is_blocked(
+                    4 if isinstance(ip_id, int) else 6,
+                    ip_id,
+                    per_providers,
+                    bl_providers,
+                    jail_providers,
+                )
+                result[ip] = {"blocked": blocked}
+            return result
         except Exception as e:
             logger.error(f"Error checking IP in RBL: {str(e)}")
             raise
@@ -148,28 +204,103 @@ class RBLDao(MongoDAO):
             logger.error(f"Error deleting RBL entries by provider: {str(e)}")
             raise
 
-    def delete_expired(self, provider_type: str, provider_id: str, bantime_limit: datetime) -> None:
+    def sync_provider(self, provider_type: str, provider_id: str, rows: Iterable[Dict[str, Any]],
+                      chunk_size: int = RBL_BATCH_SIZE) -> Dict[str, int]:
         """
-        Deletes expired RBL entries for a specific provider.
+        Makes the stored RBL entries of a provider match the given ranges.
+
+        The stored (net_start, net_end, action) keys are compared with the
+        new ranges, so only added entries are inserted (chunked insert_many)
+        and only vanished ones deleted. Inserts run before deletes, the
+        provider never goes through an empty window, and nothing is deleted
+        when an insert failed.
         
         Args:
             provider_type (str): Type of provider
             provider_id (str): ID of the provider
-            bantime_limit (datetime): Cutoff date for expiration
+            rows (Iterable[Dict[str, Any]]): Ranges (net_start, net_end, version, action)
+            chunk_size (int): Maximum documents per insert_many/delete_many call
+            
+        Returns:
+            Dict[str, int]: Number of entries 'inserted', 'deleted' and 'total' after the sync
             
         Raises:
-            PyMongoError: If an error occurs during the delete operation
+            PyMongoError: If an error occurs while writing the entries
         """
+        owner = {"provider_type": provider_type, "provider_id": ObjectId(provider_id)}
+        stored = {
+            (r["net_start"], r["net_end"], r.get("action")): r["_id"]
+            for r in self.collection.find(owner, {"net_start": 1, "net_end": 1, "action": 1})
+        }
+        kept = set()
+
+        def added():
+            for r in rows:
+                key = (r["net_start"], r["net_end"], r.get("action"))
+                if key in kept:
+                    continue
+                kept.add(key)
+                if stored.pop(key, None) is None:
+                    yield dict(r, **owner)
+
         try:
-            query = {
-                "$and": [
-                    {"provider_type": {"$eq": provider_type}},
-                    {"provider_id": {"$eq": ObjectId(provider_id)}},
-                    {"banned_on": {"$lte": bantime_limit}},
-                ]
-            }
-            logger.debug(query)
-            self.collection.delete_many(query)
+            stats = self.insert_chunks(added(), chunk_size)
+            failed = sum(s["size"] - s["inserted"] for s in stats)
+            if failed:
+                raise PyMongoError(f"{failed} entries not inserted, stored entries kept")
+            removed = list(stored.values())
+            for i in range(0, len(removed), chunk_size):
+                self.collection.delete_many({"_id": {"$in": removed[i:i + chunk_size]}})
+        except Exception as e:
+            logger.error(f"Error syncing RBL entries of {provider_id}: {str(e)}")
+            raise
+        return {
+            "inserted": sum(s["inserted"] for s in stats),
+            "deleted": len(removed),
+            "total": len(kept),
+        }
+
+    def upsert_bans(self, jail_id: str, ips: Iterable[str], banned_on: datetime, bantime: int) -> int:
+        """
+        Bans addresses in a jail with a single unordered bulk_write of upserts.
+
+        Each ban gets an 'expire_on' date, the TTL index on that field
+        removes it once the jail bantime is over.
+        
+        Args:
+            jail_id (str): ID of the jail
+            ips (Iterable[str]): Addresses to ban or whose ban is extended
+            banned_on (datetime): Ban date
+            bantime (int): Ban duration in minutes
+            
+        Returns:
+            int: Number of bans inserted or extended
+            
+        Raises:
+            PyMongoError: If an error occurs during the write operation
+        """
+        try:
+            expire_on = banned_on + timedelta(minutes=bantime)
+            ops = []
+            for ip in ips:
+                ban = NetworkTool.range_from_network(ip)
+                ops.append(
+                    UpdateOne(
+                        {
+                            "provider_type": "jail",
+                            "provider_id": ObjectId(jail_id),
+                            "action": "deny",
+                            "net_start": ban["net_start"],
+                            "net_end": ban["net_end"],
+                        },
+                        {"$set": {"version": ban["version"], "banned_on": banned_on, "expire_on": expire_on}},
+                        upsert=True,
+                    )
+                )
+            if not ops:
+                return 0
+            rs = self.collection.bulk_write(ops, ordered=False)
+            return rs.upserted_count + rs.modified_count
         except Exception as e:
-            logger.error(f"Error deleting expired RBL entries: {str(e)}")
+            logger.error(f"Error banning addresses in jail {jail_id}: {str(e)}")
             raise
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, Iterable, List, Optional, Union
 from bson import ObjectId
 from marshmallow import EXCLUDE, Schema, fields
 
@@ -214,20 +214,26 @@ class RuleDao(MongoDAO):
             logger.error(f"Error finding rules by category: {str(e)}")
             raise
 
-    def _to_dict(self, vo: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    def _relations(self, vo: Dict[str, Any]) -> Iterable[tuple]:
+        if vo.get("category_id"):
+            yield RuleCategoryDao, False, vo["category_id"]
+
+    def _to_dict(self, vo: Optional[Dict[str, Any]], refs: Optional[Dict[tuple, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Loads a rule document with its category information.
         
         Args:
             vo (Optional[Dict[str, Any]]): Rule document to load
+            refs (Optional[Dict[tuple, Any]]): References loaded for the result set, see _load_relations
             
         Returns:
             Optional[Dict[str, Any]]: Loaded rule document
         """
         if vo:
+            if refs is None:
+                refs = self._load_relations([vo])
             super()._to_dict(vo)
-            daoc = RuleCategoryDao()
-            vo.update({"category": daoc.get_descr_by_id(vo.pop("category_id"))})
+            vo.update({"category": self._ref(refs, RuleCategoryDao, vo.pop("category_id"))})
         return vo
 
 
@@ -374,21 +380,24 @@ class RuleCategoryDao(MongoDAO):
             logger.error(f"Error retrieving categories by name and phases: {str(e)}")
             raise
 
-    def _to_dict(self, vo: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    def _relations(self, vo: Dict[str, Any]) -> Iterable[tuple]:
+        for r_id in vo.get("rule_ids") or []:
+            yield RuleDao, True, r_id
+
+    def _to_dict(self, vo: Optional[Dict[str, Any]], refs: Optional[Dict[tuple, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Loads a category document with its associated rules.
         
         Args:
             vo (Optional[Dict[str, Any]]): Category document to load
+            refs (Optional[Dict[tuple, Any]]): References loaded for the result set, see _load_relations
             
         Returns:
             Optional[Dict[str, Any]]: Loaded category document
         """
+        if refs is None:
+            refs = self._load_relations([vo])
         super()._to_dict(vo)
         if vo and "rule_ids" in vo:
-            rules = []
-            dao_rule = RuleDao()
-            for r_id in vo.pop("rule_ids"):
-                rules.append(dao_rule.get_by_id(r_id))
-            vo.update({"rules": rules})
+            vo.update({"rules": [self._ref(refs, RuleDao, r_id, full=True) for r_id in vo.pop("rule_ids")]})
         return vo
@@ -1,8 +1,7 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, Optional
 from bson import ObjectId
 from marshmallow import EXCLUDE, Schema, fields
 
-from common_utils import logger
 from model.feed_model import FeedDao, FeedSchema
 from model.jail_model import JailDao
 from model.mongo_base_model import MongoDAO
@@ -44,38 +43,35 @@ class SensorDao(MongoDAO):
 
 
 
-    def _to_dict(self, vo: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    def _relations(self, vo: Dict[str, Any]) -> Iterable[tuple]:
+        for b in (vo.get("block_ids") or []) + (vo.get("permit_ids") or []):
+            yield FeedDao, False, b
+        for b in vo.get("jail_ids") or []:
+            yield JailDao, False, b
+
+    def _to_dict(self, vo: Optional[Dict[str, Any]], refs: Optional[Dict[tuple, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Loads a sensor document with its associated feeds and jails.
         
         Args:
             vo (Optional[Dict[str, Any]]): Sensor document to load
+            refs (Optional[Dict[tuple, Any]]): References loaded for the result set, see _load_relations
             
         Returns:
             Optional[Dict[str, Any]]: Loaded sensor document
         """
         if vo:
+            if refs is None:
+                refs = self._load_relations([vo])
             super()._to_dict(vo)
             if "block_ids" in vo:
-                block = []
-                dao = FeedDao()
-                for b in vo.pop("block_ids"):
-                    block.append(dao.get_descr_by_id(str(b)))
-                vo.update({"block": block})
+                vo.update({"block": [self._ref(refs, FeedDao, b) for b in vo.pop("block_ids")]})
 
             if "permit_ids" in vo:
-                permit = []
-                dao = FeedDao()
-                for b in vo.pop("permit_ids"):
-                    permit.append(dao.get_descr_by_id(str(b)))
-                vo.update({"permit": permit})
+                vo.update({"permit": [self._ref(refs, FeedDao, b) for b in vo.pop("permit_ids")]})
 
             if "jail_ids" in vo:
-                jails = []
-                dao = JailDao()
-                for b in vo.pop("jail_ids"):
-                    jails.append(dao.get_descr_by_id(str(b)))
-                vo.update({"jails": jails})
+                vo.update({"jails": [self._ref(refs, JailDao, b) for b in vo.pop("jail_ids")]})
         return vo
 
     def _from_dict(self, vo: Dict[str, Any]) -> Dict[str, Any]:
@@ -107,25 +103,3 @@ class SensorDao(MongoDAO):
                     jail_ids.append(ObjectId(b["_id"]))
                 vo.update({"jail_ids": jail_ids})
         return vo
-
-    def get_ids_by_jail(self, jail_id: str) -> List[str]:
-        """
-        Retrieves sensor IDs associated with a specific jail.
-        
-        Args:
-            jail_id (str): Jail ID to search for
-            
-        Returns:
-            List[str]: List of sensor IDs
-            
-        Raises:
-            PyMongoError: If an error occurs during the search operation
-        """
-        try:
-            query = {"jail_ids": ObjectId(jail_id)}
-            logger.debug(query)
-            rows = list(self.collection.find(query))
-            return [str(doc["_id"]) for doc in rows]
-        except Exception as e:
-            logger.error(f"Error retrieving sensor IDs by jail: {str(e)}")
-            raise
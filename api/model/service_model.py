@@ -1,4 +1,4 @@
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, Iterable, List, Optional, Union
 from bson import ObjectId
 from marshmallow import EXCLUDE, Schema, fields
 
@@ -191,21 +191,35 @@ class ServiceDao(MongoDAO):
                     route.update({"sensor_id": ObjectId(sensor["_id"])})
         return vo
 
-    def _to_dict(self, vo: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    def _relations(self, vo: Dict[str, Any]) -> Iterable[tuple]:
+        if vo.get("certificate_id"):
+            yield CertificateDao, True, vo["certificate_id"]
+        for route in vo.get("routes") or []:
+            for b in route.get("filter_ids") or []:
+                yield RouteFilterDao, True, b
+            if "upstream" in route.get("type", "upstream") and route.get("upstream_id"):
+                yield UpstreamDao, False, route["upstream_id"]
+            if route.get("sensor_id"):
+                yield SensorDao, False, route["sensor_id"]
+
+    def _to_dict(self, vo: Optional[Dict[str, Any]], refs: Optional[Dict[tuple, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Loads a service document with its associated resources.
         
         Args:
             vo (Optional[Dict[str, Any]]): Service document to load
+            refs (Optional[Dict[tuple, Any]]): References loaded for the result set, see _load_relations
             
         Returns:
             Optional[Dict[str, Any]]: Loaded service document
         """
+        if refs is None:
+            refs = self._load_relations([vo])
         super()._to_dict(vo)
 
         if "certificate_id" in vo:
             crt_id = vo.pop("certificate_id")
-            vo.update({"certificate": CertificateDao().get_by_id(ObjectId(crt_id))})
+            vo.update({"certificate": self._ref(refs, CertificateDao, crt_id, full=True)})
 
         if "routes" in vo:
             for route in vo["routes"]:
@@ -213,21 +227,16 @@ class ServiceDao(MongoDAO):
                     route.update({"type": "upstream"})
 
                 if "filter_ids" in route:
-                    fs = []
-                    dao = RouteFilterDao()
-                    for b in route.pop("filter_ids"):
-                        fs.append(dao.get_by_id(str(b)))
+                    fs = [self._ref(refs, RouteFilterDao, b, full=True) for b in route.pop("filter_ids")]
                     route.update({"filters": fs})
 
                 if "upstream" in route["type"]:
                     upstream_id = route.pop("upstream_id")
-                    ups_dao = UpstreamDao()
-                    route.update({"upstream": ups_dao.get_descr_by_id(upstream_id)})
+                    route.update({"upstream": self._ref(refs, UpstreamDao, upstream_id)})
 
                 if "sensor_id" in route:
                     sensor_id = route.pop("sensor_id")
-                    sen_dao = SensorDao()
-                    route.update({"sensor": sen_dao.get_descr_by_id(sensor_id)})
+                    route.update({"sensor": self._ref(refs, SensorDao, sensor_id)})
         return vo
 
     def get_by_sans(self, sans: List[str], active: Optional[bool] = None) -> Optional[Dict[str, Any]]:
@@ -274,9 +283,7 @@ class ServiceDao(MongoDAO):
         try:
             query = {"provider": {"$in": ssl_provider}}
             logger.debug(query)
-            rows = list(self.collection.find(query))
-            for e in rows:
-                 self._to_dict(e)
+            rows = self._to_dict_all(list(self.collection.find(query)))
             return rows
         except Exception as e:
             logger.error(f"Error retrieving services for renewal: {str(e)}")
@@ -298,9 +305,7 @@ class ServiceDao(MongoDAO):
         try:
             query = {"certificate_id": ObjectId(certificate_id), "active": True}
             logger.debug(query)
-            rows = list(self.collection.find(query))
-            for e in rows:
-                 self._to_dict(e)
+            rows = self._to_dict_all(list(self.collection.find(query)))
             return rows
         except Exception as e:
             logger.error(f"Error retrieving services by certificate: {str(e)}")
@@ -1,14 +1,18 @@
-from typing import Dict, Any, List, Optional, Union
+import base64
+import json
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from bson import ObjectId
+from bson.errors import InvalidId
 from marshmallow import EXCLUDE, Schema, fields
+from pymongo import UpdateOne
 
-from common_utils import logger, replace_tz
+from common_utils import LRUCache, hash_dict, logger
 from model.mongo_base_model import MongoDAO
 from model.sensor_model import SensorSchema, SensorDao
 from model.service_model import ServiceSchema, ServiceDao
 from model.upstream_model import UpstreamSchema, UpstreamDao
-from config import DATETIME_FMT, TZ, TELEMETRY_INTERVAL
+from config import DATETIME_FMT, TZ, TRN_BATCH_SIZE, TRN_COUNT_TTL
 
 
 class TransactionHeaderSchema(Schema):
@@ -244,27 +248,39 @@ class TransactionDao(MongoDAO):
         super().__init__("transaction", schema=TransactionSchema)
 
 
-    def _to_dict(self, vo: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    __RELATIONS = [("sensor", SensorDao), ("service", ServiceDao), ("upstream", UpstreamDao)]
+    count_cache = LRUCache(256, TRN_COUNT_TTL)  # search counts by query hash
+    LIST_FIELDS = [  # columns of list views, headers and audit messages come from get_by_id
+        "logtime", "unique_id", "server_id", "action", "score", "route_name",
+        "limit_req_status", "geoip_status", "rbl_status", "source", "user_agent",
+        "http.duration", "http.request_line", "http.request.bytes",
+        "http.response.status_code", "http.response.bytes",
+        "sensor", "service", "upstream",
+    ]
+
+    def _relations(self, vo: Dict[str, Any]) -> Iterable[tuple]:
+        for name, dao_class in self.__RELATIONS:
+            if vo.get(f"{name}_id"):
+                yield dao_class, False, vo[f"{name}_id"]
+
+    def _to_dict(self, vo: Optional[Dict[str, Any]], refs: Optional[Dict[tuple, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Loads a transaction document with its associated resources.
         
         Args:
             vo (Optional[Dict[str, Any]]): Transaction document to load
+            refs (Optional[Dict[tuple, Any]]): References loaded for the result set, see _load_relations
             
         Returns:
             Optional[Dict[str, Any]]: Loaded transaction document
         """
         if vo:
+            if refs is None:
+                refs = self._load_relations([vo])
             super()._to_dict(vo)
-            if "sensor_id" in vo:
-                dao = SensorDao()
-                vo.update({"sensor": dao.get_descr_by_id(vo.pop("sensor_id"))})
-            if "service_id" in vo:
-                dao = ServiceDao()
-                vo.update({"service": dao.get_descr_by_id(vo.pop("service_id"))})
-            if "upstream_id" in vo:
-                dao = UpstreamDao()
-                vo.update({"upstream": dao.get_descr_by_id(vo.pop("upstream_id"))})
+            for name, dao_class in self.__RELATIONS:
+                if f"{name}_id" in vo:
+                    vo.update({name: self._ref(refs, dao_class, vo.pop(f"{name}_id"))})
         return vo
 
     def _from_dict(self, vo: Dict[str, Any]) -> Dict[str, Any]:
@@ -294,6 +310,34 @@ class TransactionDao(MongoDAO):
                 vo.update({"service_id": ObjectId(service["_id"])})
         return vo
 
+    def persist_batch(self, vos: List[Dict[str, Any]], chunk_size: int = TRN_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Persists transactions with unordered insert_many calls.
+
+        Sensor, service and upstream references are converted in a single
+        pass sharing the ObjectId instances, then documents are written in
+        chunks of chunk_size. A failed document does not stop the chunk.
+        
+        Args:
+            vos (List[Dict[str, Any]]): Transaction documents to persist
+            chunk_size (int): Maximum documents per insert_many call
+            
+        Returns:
+            List[Dict[str, Any]]: Per batch stats with 'size', 'inserted' and 'latency' (ms)
+        """
+        oids = {}
+        for vo in vos:
+            vo.pop("_id", None)
+            for ref in ["sensor", "upstream", "service"]:
+                if ref in vo:
+                    ref_id = vo.pop(ref)["_id"]
+                    if ref_id:
+                        if ref_id not in oids:
+                            oids[ref_id] = ObjectId(ref_id)
+                        vo.update({f"{ref}_id": oids[ref_id]})
+
+        return self.insert_chunks(vos, chunk_size)
+
     def purge_before_date(self, purge_date: datetime) -> int:
         """
         Purges transactions older than the specified date.
@@ -366,100 +410,13 @@ class TransactionDao(MongoDAO):
             logger.error(f"Error updating transaction by server and unique ID: {str(e)}")
             raise
 
-    def get_node_bandwidth(self, server_id: str) -> List[Dict[str, Any]]:
-        """
-        Retrieves bandwidth statistics for a specific node.
-        
-        Args:
-            server_id (str): Server ID
-            
-        Returns:
-            List[Dict[str, Any]]: List of bandwidth statistics
-            
-        Raises:
-            PyMongoError: If an error occurs during the aggregation operation
-        """
-        try:
-            query = [
-                {
-                    "$match": {
-                        "logtime": {"$gte": (datetime.now(TZ) - timedelta(minutes=1))},
-                        "server_id": server_id,
-                    },
-                },
-                {
-                    "$group": {
-                        "_id": {
-                            "year": {"$year": "$logtime"},
-                            "month": {"$month": "$logtime"},
-                            "day": {"$dayOfMonth": "$logtime"},
-                            "hour": {"$hour": "$logtime"},
-                            "minute": {"$minute": "$logtime"},
-                        },
-                        "net_recv": {"$sum": "$http.request.bytes"},
-                        "net_send": {"$sum": "$http.response.bytes"},
-                        "req_total": {"$sum": 1},
-                    }
-                },
-                {"$limit": 1},
-            ]
-            logger.debug(query)
-            rs = self.collection.aggregate(query)
-            return list(rs)
-        except Exception as e:
-            logger.error(f"Error retrieving node bandwidth: {str(e)}")
-            raise
-
-    def get_trn_telemetry(self, dt_start: datetime) -> List[Dict[str, Any]]:
-        """
-        Retrieves telemetry data for transactions.
-        
-        Args:
-            dt_start (datetime): Start time for telemetry data
-            
-        Returns:
-            List[Dict[str, Any]]: List of telemetry records
-            
-        Raises:
-            PyMongoError: If an error occurs during the aggregation operation
-        """
-        try:
-            query = [
-                {
-                    "$match": {
-                        "logtime": {"$gt": dt_start - timedelta(minutes=TELEMETRY_INTERVAL)}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": {"server_id": "$server_id"},
-                        "net_recv": {"$sum": "$http.request.bytes"},
-                        "net_send": {"$sum": "$http.response.bytes"},
-                        "req_total": {"$sum": 1},
-                        "latency": {"$avg": "$http.duration"},
-                    }
-                },
-            ]
-            logger.debug(query)
-            rs = self.collection.aggregate(query)
-            records = list(rs)
-            if records:
-                for s in records:
-                    dtj = s.pop("_id")
-                    s.update(
-                        {
-                            "logtime": dt_start,
-                            "server_id": dtj["server_id"],
-                        }
-                    )
-            return records
-        except Exception as e:
-            logger.error(f"Error retrieving transaction telemetry: {str(e)}")
-            raise
-
     def get_tpm(self, dt_start: datetime, dt_end: datetime, filters: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """
         Retrieves transactions per minute statistics.
+
+        Filters on the rollup key (server, service, route, action) are
+        served by TransactionRollupDao, other filters aggregate the
+        transactions themselves.
         
         Args:
             dt_start (datetime): Start time
@@ -473,6 +430,9 @@ class TransactionDao(MongoDAO):
             PyMongoError: If an error occurs during the aggregation operation
         """
         try:
+            filters = self.translate_filters(filters) if filters else []
+            if all(k in TransactionRollupDao.KEY for f in filters for k in f):
+                return TransactionRollupDao().get_tpm(dt_start, dt_end, {k: v for f in filters for k, v in f.items()})
             query = [
                 {
                     "$match": {
@@ -496,10 +456,8 @@ class TransactionDao(MongoDAO):
                 },
                 {"$sort": {"_id": 1}},
             ]
-            if filters:
-                filters = self.translate_filters(filters)
-                for f in filters:
-                    query[0]["$match"].update(f)
+            for f in filters:
+                query[0]["$match"].update(f)
             logger.debug(query)
             rs = self.collection.aggregate(query)
             return list(rs)
@@ -520,39 +478,143 @@ class TransactionDao(MongoDAO):
                 f.update({"service_id": ObjectId(service["_id"])})
         return filters
     
-    def get_last_n_minutes(self, minutes: int, sensor_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    @classmethod
+    def projection(cls, fields: Optional[List[str]] = None) -> Optional[Dict[str, int]]:
+        """
+        Builds the find projection of a transaction listing.
+
+        Resolved references (sensor, service, upstream) are read from their
+        stored id, logtime is always kept as the keyset pagination key.
+        
+        Args:
+            fields (Optional[List[str]]): Dotted field paths, e.g. LIST_FIELDS
+            
+        Returns:
+            Optional[Dict[str, int]]: Inclusion projection, None for full documents
+        """
+        if not fields:
+            return None
+        projection = {"logtime": 1}
+        for f in fields:
+            name = f.split(".")[0]
+            if name in {n for n, _ in cls.__RELATIONS}:
+                projection[f"{name}_id"] = 1
+            else:
+                projection[f] = 1
+        # a path and one of its children in the same projection is a path collision
+        return {k: v for k, v in projection.items() if not any(k.startswith(f"{p}.") for p in projection)}
+
+    @classmethod
+    def encode_cursor(cls, vo: Dict[str, Any]) -> str:
+        """
+        Builds the opaque keyset cursor of a transaction, its (logtime, _id) position.
+        
+        Args:
+            vo (Dict[str, Any]): Transaction document with logtime and _id
+            
+        Returns:
+            str: URL safe cursor
+        """
+        key = json.dumps([vo["logtime"].isoformat(), str(vo["_id"])])
+        return base64.urlsafe_b64encode(key.encode()).decode()
+
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> Tuple[datetime, ObjectId]:
+        """
+        Reads the (logtime, _id) position of a cursor built by encode_cursor.
+        
+        Args:
+            cursor (str): Cursor of the last transaction of the previous page
+            
+        Returns:
+            Tuple[datetime, ObjectId]: logtime and _id of that transaction
+            
+        Raises:
+            ValueError: If the cursor is malformed
         """
-        Retrieves transactions from the last N minutes for specific sensors.
+        try:
+            logtime, _id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(logtime), ObjectId(_id)
+        except (TypeError, ValueError, InvalidId) as e:
+            raise ValueError(f"Invalid cursor {cursor}") from e
+
+    def count(self, query: Dict[str, Any]) -> int:
+        """
+        Counts the transactions of a query, reusing the count for TRN_COUNT_TTL seconds.
         
         Args:
-            minutes (int): Number of minutes to look back
-            sensor_ids (Optional[List[str]]): List of sensor IDs to filter by
+            query (Dict[str, Any]): Find query
             
         Returns:
-            List[Dict[str, Any]]: List of transaction documents
+            int: Number of matching transactions
+        """
+        if not query:
+            return self.collection.estimated_document_count()
+        return self.count_cache.get_or_set(hash_dict(query), lambda _: self.collection.count_documents(query))
+
+    def get_page(self, per_page: int, cursor: Optional[str] = None,
+                 dt_start: Optional[datetime] = None,
+                 dt_end: Optional[datetime] = None,
+                 filters: Optional[List[Dict[str, Any]]] = None,
+                 with_count: bool = False,
+                 fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Retrieves a page of transactions with keyset pagination, newest first.
+
+        Pages are read from the (logtime, _id) position of the cursor, so
+        deep pages cost the same as the first one. The total is only
+        counted when asked for, and cached.
+        
+        Args:
+            per_page (int): Page size
+            cursor (Optional[str]): 'next' cursor of the previous page, None for the first page
+            dt_start (Optional[datetime]): Start date filter
+            dt_end (Optional[datetime]): End date filter
+            filters (Optional[List[Dict[str, Any]]]): Additional filters
+            with_count (bool): Count the matching transactions
+            fields (Optional[List[str]]): Fields to return, see projection, full documents when None
+            
+        Returns:
+            Dict[str, Any]: Dictionary with metadata (per_page, next, total_elements) and data
             
         Raises:
+            ValueError: If the cursor is malformed
             PyMongoError: If an error occurs during the search operation
         """
         try:
-            dt_start = replace_tz((datetime.now() - timedelta(minutes=minutes)))
-            query = {
-                "logtime": {"$gte": dt_start},
-                "sensor_id": {"$in": [ObjectId(id_str) for id_str in sensor_ids]},
+            query = {}
+            if dt_start and dt_end:
+                query.update({"logtime": {"$gte": dt_start, "$lte": dt_end}})
+            for f in self.translate_filters(filters or []):
+                query.update(f)
+            page_query = query
+            if cursor:
+                logtime, _id = self.decode_cursor(cursor)
+                after = {"$or": [{"logtime": {"$lt": logtime}}, {"logtime": logtime, "_id": {"$lt": _id}}]}
+                page_query = {"$and": [query, after]} if query else after
+            logger.debug(page_query)
+            rows = list(
+                self.collection.find(page_query, self.projection(fields))
+                .sort([("logtime", -1), ("_id", -1)])
+                .limit(per_page + 1)
+            )
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            metadata = {
+                "per_page": per_page,
+                "next": self.encode_cursor(rows[-1]) if has_next else None,
+                "total_elements": self.count(query) if with_count else None,
             }
-            logger.debug(query)
-            rows = list(self.collection.find(query))
-            for e in rows:
-                 self._to_dict(e)
-            return rows
+            return {"metadata": metadata, "data": self._to_dict_all(rows)}
         except Exception as e:
-            logger.error(f"Error retrieving last N minutes transactions: {str(e)}")
+            logger.error(f"Error retrieving transactions page: {str(e)}")
             raise
 
     def get_all(self, pagination: Optional[Dict[str, Any]] = None, 
                 dt_start: Optional[datetime] = None, 
                 dt_end: Optional[datetime] = None, 
-                filters: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+                filters: Optional[List[Dict[str, Any]]] = None,
+                fields: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Retrieves all transactions with optional filtering and pagination.
         
@@ -561,6 +623,7 @@ class TransactionDao(MongoDAO):
             dt_start (Optional[datetime]): Start date filter
             dt_end (Optional[datetime]): End date filter
             filters (Optional[List[Dict[str, Any]]]): Additional filters
+            fields (Optional[List[str]]): Fields to return, see projection, full documents when None
             
         Returns:
             Dict[str, Any]: Dictionary with metadata and data
@@ -569,6 +632,7 @@ class TransactionDao(MongoDAO):
             PyMongoError: If an error occurs during the search operation
         """
         try:
+            projection = [{"$project": self.projection(fields)}] if fields else []
             query = [
                 {"$match": {}},
                 {"$sort": {"logtime": -1}},
@@ -587,13 +651,13 @@ class TransactionDao(MongoDAO):
                                     )
                                 },
                                 {"$limit": pagination["per_page"]},
-                            ],
+                            ] + projection,
                             "pagination": [{"$count": "total"}],
                         }
                     }
                 )
             else:
-                query.append({"$facet": {"data": []}})
+                query.append({"$facet": {"data": projection}})
             if filters:
                 filters = self.translate_filters(filters)
                 for f in filters:
@@ -605,3 +669,195 @@ class TransactionDao(MongoDAO):
         except Exception as e:
             logger.error(f"Error retrieving all transactions: {str(e)}")
             raise
+
+
+class TransactionSummaryDao(MongoDAO):
+    """
+    DAO for managing transaction summaries.
+    
+    Every access log entry is stored here as a compact record (ids, status,
+    bytes and duration), audited or not, so traffic statistics cover all
+    requests while full documents are kept only for audited ones.
+    """
+    
+    def __init__(self):
+        """
+        Initializes the DAO with the 'transaction_summary' time-series collection.
+        """
+        super().__init__("transaction_summary")
+
+    def persist_batch(self, vos: List[Dict[str, Any]], chunk_size: int = TRN_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Persists summary records with unordered insert_many calls.
+        
+        Args:
+            vos (List[Dict[str, Any]]): Summary records to persist
+            chunk_size (int): Maximum documents per insert_many call
+            
+        Returns:
+            List[Dict[str, Any]]: Per batch stats with 'size', 'inserted' and 'latency' (ms)
+        """
+        oids = {}
+        for vo in vos:
+            for target, ref in [(vo["meta"], "service_id"), (vo, "sensor_id"), (vo, "upstream_id")]:
+                ref_id = target.get(ref)
+                if ref_id:
+                    if ref_id not in oids:
+                        oids[ref_id] = ObjectId(ref_id)
+                    target[ref] = oids[ref_id]
+        return self.insert_chunks(vos, chunk_size)
+
+
+class TransactionRollupDao(MongoDAO):
+    """
+    DAO for the per-minute traffic rollups.
+
+    The ingestion pipeline adds every flushed batch to one document per
+    (minute, server, service, route, action) with $inc upserts, so the
+    dashboards and telemetry read a few documents per minute whatever the
+    traffic volume. 'count' covers every request, 'trn_count' the audited
+    ones stored as transactions.
+    """
+
+    KEY = ["server_id", "service_id", "route_name", "action"]
+    LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # request duration upper bounds (s)
+
+    def __init__(self):
+        """
+        Initializes the DAO with the 'transaction_rollup' collection.
+        """
+        super().__init__("transaction_rollup")
+
+    @classmethod
+    def bucket(cls, duration: float) -> str:
+        """Name of the latency histogram bucket of a request duration (s)."""
+        for b in cls.LATENCY_BUCKETS:
+            if duration <= b:
+                return f"le_{int(b * 1000)}ms"
+        return "le_inf"
+
+    @classmethod
+    def _key(cls, logtime, server_id, service_id, route_name, action) -> tuple:
+        """(minute, *KEY) of a request, a missing service or route is stored as ''."""
+        service_id = ObjectId(service_id) if service_id else ""
+        return logtime.replace(second=0, microsecond=0), server_id, service_id, route_name or "", action
+
+    def rollup(self, summaries: List[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> int:
+        """
+        Adds a flushed batch to the per-minute rollups.
+        
+        Args:
+            summaries (List[Dict[str, Any]]): Access summaries, see LogParserTool.summarize
+            transactions (List[Dict[str, Any]]): Merged transactions of the same batch, as
+                stored by TransactionDao.persist_batch (service_id in place of service)
+            
+        Returns:
+            int: Number of rollup documents updated or created
+            
+        Raises:
+            PyMongoError: If an error occurs during the bulk write
+        """
+        incs = {}
+        for s in summaries:
+            key = self._key(
+                s["logtime"], s["meta"]["server_id"], s["meta"].get("service_id"), s.get("route_name"), s["action"]
+            )
+            inc = incs.setdefault(key, {})
+            duration = float(s.get("duration") or 0)
+            for field, value in [
+                ("count", 1),
+                ("bytes_in", s.get("bytes_in") or 0),
+                ("bytes_out", s.get("bytes_out") or 0),
+                ("duration_sum", duration),
+                (f"latency.{self.bucket(duration)}", 1),
+            ]:
+                inc[field] = inc.get(field, 0) + value
+        for t in transactions:
+            key = self._key(
+                t["logtime"], t["server_id"], t.get("service_id"), t.get("route_name"), t["action"]
+            )
+            inc = incs.setdefault(key, {})
+            inc["trn_count"] = inc.get("trn_count", 0) + 1
+        if not incs:
+            return 0
+        ops = [
+            UpdateOne(dict(zip(["minute"] + self.KEY, key)), {"$inc": inc}, upsert=True)
+            for key, inc in incs.items()
+        ]
+        rs = self.collection.bulk_write(ops, ordered=False)
+        return rs.upserted_count + rs.modified_count
+
+    def get_tpm(self, dt_start: datetime, dt_end: datetime, match: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieves transactions per minute from the rollups.
+        
+        Args:
+            dt_start (datetime): Start time
+            dt_end (datetime): End time
+            match (Optional[Dict[str, Any]]): Conditions on the rollup KEY fields
+            
+        Returns:
+            List[Dict[str, Any]]: TPM statistics, in the format of TransactionDao.get_tpm
+            
+        Raises:
+            PyMongoError: If an error occurs during the aggregation operation
+        """
+        try:
+            query = [
+                {"$match": dict(match or {}, minute={"$gte": dt_start, "$lt": dt_end})},
+                {"$group": {"_id": "$minute", "count": {"$sum": "$trn_count"}}},
+                {"$match": {"count": {"$gt": 0}}},
+                {"$sort": {"_id": 1}},
+            ]
+            logger.debug(query)
+            rows = list(self.collection.aggregate(query))
+            return [
+                {
+                    "_id": {"year": m.year, "month": m.month, "day": m.day, "hour": m.hour, "minute": m.minute},
+                    "count": r["count"],
+                }
+                for r in rows
+                for m in [r["_id"]]
+            ]
+        except Exception as e:
+            logger.error(f"Error retrieving TPM rollups: {str(e)}")
+            raise
+
+    def get_nodes_bandwidth(self, server_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves the traffic of the last complete minute of several nodes in one query.
+
+        The current minute is still being written, reading it would
+        understate the traffic.
+        
+        Args:
+            server_ids (List[str]): Server IDs
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: net_recv, net_send and req_total by server ID, idle nodes are left out
+            
+        Raises:
+            PyMongoError: If an error occurs during the aggregation operation
+        """
+        try:
+            query = [
+                {
+                    "$match": {
+                        "minute": datetime.now(TZ).replace(second=0, microsecond=0) - timedelta(minutes=1),
+                        "server_id": {"$in": server_ids},
+                    },
+                },
+                {
+                    "$group": {
+                        "_id": "$server_id",
+                        "net_recv": {"$sum": "$bytes_in"},
+                        "net_send": {"$sum": "$bytes_out"},
+                        "req_total": {"$sum": "$count"},
+                    }
+                },
+            ]
+            logger.debug(query)
+            return {r.pop("_id"): r for r in self.collection.aggregate(query)}
+        except Exception as e:
+            logger.error(f"Error retrieving node bandwidth: {str(e)}")
+            raise
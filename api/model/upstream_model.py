@@ -215,9 +215,7 @@ class UpstreamDao(MongoDAO):
         """
         try:
             query = {"type": {"$eq": t}}
-            rows = list(self.collection.find(query))
-            for r in rows:
-                 self._to_dict(r)
+            rows = self._to_dict_all(list(self.collection.find(query)))
             return rows
         except Exception as e:
             logger.error(f"Error retrieving upstreams by type: {str(e)}")
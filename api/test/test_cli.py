@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+
+from pymongo.errors import OperationFailure
+
+from cli import copy_timeseries, sync_indexes
+
+
+class TestSyncIndexes(unittest.TestCase):
+    SCHEMA = [
+        {"name": "_id"},
+        {"name": "slug", "unique": True},
+        {"name": "rollup_key", "keys": {"minute": 1, "server_id": 1}, "unique": True},
+    ]
+
+    def _collection(self, existing):
+        collection = mock.Mock()
+        collection.name = "feed"
+        collection.index_information.return_value = existing
+        return collection
+
+    def test_float_directions(self):
+        collection = self._collection({
+            "_id_": {"key": [("_id", 1)]},
+            "slug_1": {"key": [("slug", 1.0)], "unique": True},
+            "rollup_key": {"key": [("minute", 1.0), ("server_id", 1.0)], "unique": True},
+        })
+        sync_indexes(collection, self.SCHEMA)
+        collection.drop_index.assert_not_called()
+        collection.create_index.assert_not_called()
+
+    def test_failed_rebuild(self):
+        collection = self._collection({
+            "_id_": {"key": [("_id", 1)]},
+            "slug_1": {"key": [("slug", 1)]},
+            "rollup_key": {"key": [("minute", 1), ("server_id", 1)], "unique": True},
+        })
+        collection.create_index.side_effect = [OperationFailure("E11000 duplicate key"), None]
+        sync_indexes(collection, self.SCHEMA)
+        collection.drop_index.assert_called_once_with("slug_1")
+        # the non unique index is restored when duplicates block the unique one
+        self.assertEqual(collection.create_index.call_args_list, [
+            mock.call([("slug", 1)], name="slug_1", unique=True),
+            mock.call([("slug", 1)], name="slug_1"),
+        ])
+
+
+class TestCopyTimeseries(unittest.TestCase):
+    SCHEMA = {"name": "transaction_summary", "timeseries": {"timeField": "logtime"}, "expireAfterSeconds": 60}
+
+    def test_copy(self):
+        source, target = mock.Mock(), mock.Mock()
+        source.find.return_value = iter([{"logtime": 1}] * 3)
+        target.insert_many.side_effect = lambda docs, ordered: mock.Mock(inserted_ids=[None] * len(docs))
+        copy_timeseries(source, target, self.SCHEMA, batch_size=2)
+        self.assertEqual(list(source.find.call_args[0][0]), ["logtime"])
+        self.assertEqual(target.insert_many.call_count, 2)
+        source.drop.assert_called_once()
+
+    def test_failed_copy(self):
+        source, target = mock.Mock(), mock.Mock()
+        source.find.return_value = iter([{"logtime": 1}])
+        target.insert_many.side_effect = OperationFailure("down")
+        copy_timeseries(source, target, self.SCHEMA)
+        source.drop.assert_not_called()
@@ -0,0 +1,59 @@
+import http.server
+import threading
+import time
+import unittest
+
+from tools.download_tool import DownloadTool
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(0.5)
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = b"1.2.3.0/24\n"
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadTool(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_conditional_get(self):
+        downloader = DownloadTool(workers=1, timeout=5)
+        with downloader.get(f"{self.url}/feed") as resp:
+            self.assertEqual(resp.status_code, 200)
+            state = DownloadTool.validators(resp)
+        with downloader.get(f"{self.url}/feed", state) as resp:
+            self.assertEqual(resp.status_code, 304)
+
+    def test_run_all(self):
+        def fetch(path):
+            def job(d):
+                with d.get(f"{self.url}{path}") as resp:
+                    return resp.status_code
+            return job
+
+        started = time.perf_counter()
+        results = DownloadTool(workers=4, timeout=5).run_all(
+            {f"slow{i}": fetch("/slow") for i in range(4)} | {"broken": lambda d: 1 / 0}
+        )
+        self.assertLess(time.perf_counter() - started, 1.5)
+        self.assertEqual({r["result"] for n, r in results.items() if n != "broken"}, {200})
+        self.assertIsNotNone(results["broken"]["error"])
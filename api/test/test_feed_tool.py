@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import unittest
+from unittest import mock
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from model.rbl_model import RBLDao
+from tools.feed_tool import SecurityFeedTool
+from tools.network_tool import NetworkTool
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 7):
+            yield self.body[i:i + 7]
+
+
+class TestFeedParsing(unittest.TestCase):
+    def _ranges(self, body, feed_format, digest=None):
+        lines = SecurityFeedTool.feed_lines(FakeResponse(body), feed_format, digest)
+        return [NetworkTool.ip_from_id(r["net_start"]) for r in SecurityFeedTool.feed_ranges(lines, "deny")]
+
+    def test_text(self):
+        body = b"# comment\n1.2.3.0/24\r\nnot-a-network\n\n2001:db8::/32\n5.6.7.8"
+        self.assertEqual(self._ranges(body, "cdir_text"), ["1.2.3.0", "2001:db8::", "5.6.7.8"])
+
+    def test_gzip(self):
+        body = gzip.compress(b"1.2.3.0/24\n") + gzip.compress(b"5.6.7.8\n")
+        digest = hashlib.sha256()
+        self.assertEqual(self._ranges(body, "cdir_gz", digest), ["1.2.3.0", "5.6.7.8"])
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(body).hexdigest())
+
+
+class TestFeedSync(unittest.TestCase):
+    def setUp(self):
+        self.feed_id = str(ObjectId())
+        self.ranges = {net: NetworkTool.range_from_network(net) for net in ["1.2.3.0/24", "5.6.7.8", "9.9.9.9"]}
+        for r in self.ranges.values():
+            r["action"] = "deny"
+
+    def _stored(self, *nets):
+        return [dict(self.ranges[n], _id=ObjectId()) for n in nets]
+
+    def test_sync_provider(self):
+        dao = RBLDao()
+        stored = self._stored("1.2.3.0/24", "5.6.7.8")
+        with mock.patch.object(dao, "collection") as collection:
+            collection.find.return_value = stored
+            collection.insert_many.side_effect = lambda docs, ordered: mock.Mock(inserted_ids=[None] * len(docs))
+            rs = dao.sync_provider("feed", self.feed_id, [self.ranges["5.6.7.8"], self.ranges["9.9.9.9"]])
+        self.assertEqual(rs, {"inserted": 1, "deleted": 1, "total": 2})
+        inserted = collection.insert_many.call_args[0][0]
+        self.assertEqual([(d["net_start"], d["provider_id"]) for d in inserted],
+                         [(self.ranges["9.9.9.9"]["net_start"], ObjectId(self.feed_id))])
+        collection.delete_many.assert_called_once_with({"_id": {"$in": [stored[0]["_id"]]}})
+
+    def test_sync_provider_failed_insert(self):
+        dao = RBLDao()
+        with mock.patch.object(dao, "collection") as collection:
+            collection.find.return_value = self._stored("1.2.3.0/24")
+            collection.insert_many.side_effect = BulkWriteError({"nInserted": 0, "writeErrors": [{"errmsg": "down"}]})
+            with self.assertRaises(PyMongoError):
+                dao.sync_provider("feed", self.feed_id, [self.ranges["9.9.9.9"]])
+        collection.delete_many.assert_not_called()
+
+    def _update(self, status, body=b"", state=None):
+        resp = mock.MagicMock(status_code=status, headers={})
+        resp.iter_content.side_effect = FakeResponse(body).iter_content
+        downloader = mock.MagicMock()
+        downloader.get.return_value.__enter__.return_value = resp
+        feed = {"_id": self.feed_id, "name": "feed", "source": "https://feed", "restricted": False,
+                "action": "deny", "format": "cdir_text", "source_state": state}
+        with mock.patch("tools.feed_tool.FeedDao") as feed_dao, mock.patch("tools.feed_tool.RBLDao") as rbl_dao:
+            rbl_dao.return_value.sync_provider.return_value = {"inserted": 1, "deleted": 0, "total": 1}
+            result = SecurityFeedTool.update_feed({}, feed, downloader)
+        return result, rbl_dao.return_value, feed_dao.return_value
+
+    def test_not_modified(self):
+        result, rbl_dao, _ = self._update(304, state={"source": "https://feed", "action": "deny", "etag": "x"})
+        self.assertEqual(result, "not_modified")
+        rbl_dao.sync_provider.assert_not_called()
+
+    def test_unchanged(self):
+        body = b"1.2.3.0/24\n"
+        state = {"source": "https://feed", "action": "deny", "content_hash": hashlib.sha256(body).hexdigest()}
+        result, rbl_dao, _ = self._update(200, body, state)
+        self.assertEqual(result, "unchanged")
+        rbl_dao.sync_provider.assert_not_called()
+        # a changed source is synced even with the same content
+        result, rbl_dao, feed_dao = self._update(200, body, dict(state, action="pass"))
+        self.assertEqual(result, "updated")
+        rbl_dao.sync_provider.assert_called_once()
+        rbl_dao.load_index.assert_called_once_with(self.feed_id)
@@ -0,0 +1,36 @@
+import unittest
+
+from tools.geoip_tool import GeoIpResolver
+from tools.network_tool import NetworkTool
+
+
+class TestGeoIpResolver(unittest.TestCase):
+    def setUp(self):
+        self.resolver = GeoIpResolver(data_dir="/nonexistent")
+        rows = []
+        for net, asn, country in [
+            ("8.8.8.0/24", "15169", "US"),
+            ("1.1.1.0/24", "13335", "AU"),
+            ("2001:db8::/32", "64496", "ZZ"),
+        ]:
+            r = NetworkTool.range_from_network(net)
+            r.update({
+                "version": 4 if NetworkTool.is_ipv4(net.split("/")[0]) else 6,
+                "as_number": asn,
+                "as_description": f"AS{asn}",
+                "country_code": country,
+            })
+            rows.append(r)
+        self.resolver.tables = GeoIpResolver.build_table(rows)
+
+    def test_lookup(self):
+        info = self.resolver.lookup("8.8.8.8")
+        self.assertEqual((info["ans_number"], info["country"]), ("15169", "US"))
+        self.assertEqual(self.resolver.lookup("2001:db8::1")["country"], "ZZ")
+        self.assertEqual(self.resolver.lookup("9.9.9.9"), {})
+
+    def test_cached(self):
+        self.resolver.lookup_many(["1.1.1.1", "1.1.1.1"])
+        self.assertEqual(self.resolver.cache.stats()["hits"], 1)
+        self.resolver.lookup("1.1.1.1")["country"] = "XX"
+        self.assertEqual(self.resolver.lookup("1.1.1.1")["country"], "AU")
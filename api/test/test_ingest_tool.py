@@ -0,0 +1,107 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from unittest import mock
+
+from common_utils import LogCache
+from tools.feed_tool import SecurityFeedTool
+from tools.ingest_tool import IngestPipeline
+from tools.log_tool import LogParserTool
+
+
+def access_line(unique_id, remote_addr):
+    return json.dumps({
+        "time": "01/Jan/2024:12:00:00 +0000", "service_id": "svc", "route_name": "-", "upstream_id": "-",
+        "target_addr": "", "sensor_id": "-", "uniqueid": unique_id, "host": "example.com",
+        "remote_addr": remote_addr, "remote_port": 40000, "server_port": 443, "request_line": "GET / HTTP/1.1",
+        "method": "GET", "status": 200, "bytes_in": 100, "bytes_out": 1000, "duration": 0.01, "uht": "-",
+        "urt": "-", "referer": "-", "user_agent": "curl/8.0", "limit_req_status": "-", "geoip_status": "-",
+        "rbl_status": "-",
+    })
+
+
+class HeldPool:
+    """Parse pool whose batches complete when release() is called."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.jobs.append((future, partial(fn, *args, **kwargs)))
+        return future
+
+    def release(self):
+        for future, job in self.jobs:
+            future.set_result(job())
+        self.jobs = []
+
+
+class TestIngestPipeline(unittest.TestCase):
+    def test_parse_pool(self):
+        pipeline = IngestPipeline(log_dir="/nonexistent", parse_workers=1)
+        pipeline.parse_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        cache = LogCache()
+        lines = [access_line("a", "8.8.8.8"), access_line("b", "8.8.8.8"), access_line("c", "1.1.1.1")]
+        geo = {ip: {"country": c} for ip, c in [("8.8.8.8", "US"), ("1.1.1.1", "AU")]}
+        with mock.patch.dict(os.environ, {"SERVERID": "n1"}), \
+                mock.patch.object(SecurityFeedTool, "geo_info_many", side_effect=lambda ips: {i: geo[i] for i in ips}) as lookup:
+            pipeline._submit("svc", cache, "ACCESS", lines)
+            pipeline.parse_pool.shutdown(wait=True)
+        # workers skip the geo enrichment, the parent resolves each address once
+        lookup.assert_called_once()
+        self.assertEqual(sorted(lookup.call_args[0][0]), ["1.1.1.1", "8.8.8.8"])
+        records = {u: r for u, (_, r) in cache.access_log.items()}
+        self.assertEqual([records[u]["source"]["geo"]["country"] for u in "abc"], ["US", "US", "AU"])
+        self.assertEqual(records["a"]["server_id"], "n1")
+
+    def test_remove_service(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            pipeline = IngestPipeline(log_dir=log_dir, parse_workers=0)
+            for path in pipeline.log_files("svc"):
+                open(path, "w").close()
+            pipeline.sync_services([{"name": "svc"}])
+            with open(f"{log_dir}/access_log-svc.log", "a") as f:
+                f.write("\n".join(access_line(u, "8.8.8.8") for u in "abc") + "\n")
+            with mock.patch.dict(os.environ, {"SERVERID": "n1"}), \
+                    mock.patch.object(SecurityFeedTool, "geo_info_many", side_effect=lambda ips: {i: {} for i in ips}), \
+                    mock.patch.object(LogParserTool, "flush") as flush:
+                # the removed lines are still queued when the merge runs
+                pipeline.sync_services([])
+                pipeline.merge()
+                self.assertEqual(flush.call_count, 0)
+                pipeline.parse_queue.put(None)
+                pipeline._parse_loop()
+                pipeline.merge()
+                tasks = [pipeline.persist_queue.get() for _ in range(pipeline.persist_queue.qsize())]
+                for task in tasks:
+                    task()
+            self.assertEqual([c[0][0] for c in flush.call_args_list], ["svc"])
+            self.assertEqual(len(flush.call_args[0][1]["accesses"]), 3)
+            self.assertEqual(pipeline.removed, {})
+
+    def test_remove_service_in_pool(self):
+        pipeline = IngestPipeline(log_dir="/nonexistent", parse_workers=1)
+        pipeline.parse_pool = HeldPool()
+        cache = LogCache()
+        with mock.patch.dict(os.environ, {"SERVERID": "n1"}), \
+                mock.patch.object(SecurityFeedTool, "geo_info_many", side_effect=lambda ips: {i: {} for i in ips}):
+            pipeline._submit("svc", cache, "ACCESS", [access_line("a", "8.8.8.8")])
+            pipeline._retire("svc", cache)
+            # the batch is still in the pool, the cache is not merged yet
+            self.assertEqual(pipeline.retired, [])
+            pipeline.parse_pool.release()
+        self.assertEqual(pipeline.retired, [("svc", cache)])
+        self.assertEqual(len(cache.access_summary), 1)
+        self.assertEqual((pipeline.inflight, pipeline.closing), ({}, {}))
+
+
+class TestLogParser(unittest.TestCase):
+    def test_summarize_partial(self):
+        summary = LogParserTool.summarize({"logtime": 1, "server_id": "n1", "unique_id": "a", "action": "PASSED"})
+        self.assertEqual(summary["meta"], {"server_id": "n1", "service_id": None})
+        self.assertEqual((summary["bytes_in"], summary["bytes_out"], summary["duration"]), (0, 0, 0))
@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from common_utils import replace_tz
+from tools.jail_tool import JailRules, JailTool, JailWindow
+
+
+class TestJail(unittest.TestCase):
+    RULES = [
+        {"field": "src.header", "regex": "sqlmap"},
+        {"field": "src.request_line", "regex": "/wp-login"},
+        {"field": "status_code", "regex": "^40[13]$"},
+    ]
+
+    def setUp(self):
+        self.now = replace_tz(datetime.now())
+        self.jail = {"_id": "j1", "name": "j1", "rules": self.RULES, "interval": 5, "occurrence": 2, "bantime": 10}
+
+    def _trn(self, ip, minutes_ago, line="GET / HTTP/1.1", status=200, agent="curl", sensor="s1"):
+        return {
+            "logtime": self.now - timedelta(minutes=minutes_ago),
+            "sensor": {"_id": sensor},
+            "source": {"ip": ip},
+            "http": {
+                "request_line": line,
+                "request": {"headers": [{"content": agent}, {"content": "x"}]},
+                "response": {"status_code": status},
+            },
+        }
+
+    def test_score(self):
+        rules = JailRules(self.RULES)
+        self.assertEqual(rules.score(self._trn("1.1.1.1", 0)), 0)
+        self.assertEqual(rules.score(self._trn("1.1.1.1", 0, "POST /wp-login.php", 403, "SQLMap/1.0")), 3)
+
+    def test_window(self):
+        w = JailWindow("sig", self.jail)
+        self.assertIsNone(w.add(self._trn("1.1.1.1", 10, status=401), self.now))
+        w.expire(self.now)  # first hit decayed
+        self.assertIsNone(w.add(self._trn("1.1.1.1", 1, status=401), self.now))
+        self.assertEqual(w.add(self._trn("1.1.1.1", 0, status=401), self.now), "1.1.1.1")
+        self.assertIsNone(w.add(self._trn("1.1.1.1", 0, status=401), self.now))  # already banned
+        self.assertEqual(w.counts, {"1.1.1.1": 3})
+
+    def test_observe(self):
+        JailTool.configure({
+            "scn": "test",
+            "jails": [self.jail],
+            "sensors": [{"_id": "s1", "jails": [{"_id": "j1", "name": "j1"}]}, {"_id": "s2"}],
+        })
+        with mock.patch.object(JailTool, "ban") as ban:
+            JailTool.observe([self._trn("2.2.2.2", 0, status=403, sensor="s2")] * 3)
+            ban.assert_not_called()
+            JailTool.observe([self._trn("2.2.2.2", 0, status=403)] * 2)
+            ban.assert_called_once()
+            jail, ips, _ = ban.call_args[0]
+            self.assertEqual((jail["_id"], ips), ("j1", {"2.2.2.2"}))
@@ -0,0 +1,40 @@
+import unittest
+
+from common_utils import LogCache, LRUCache
+
+
+class TestLogCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LogCache()
+        for uid in ["a", "b", "c"]:
+            self.cache.add_access({"server_id": "srv", "unique_id": uid})
+        self.cache.add_audit({"server_id": "srv", "unique_id": "b"})
+        self.cache.add_audit({"server_id": "srv", "unique_id": "z"})
+
+    def test_pop_matches(self):
+        matches = self.cache.pop_matches()
+        self.assertEqual([(a["unique_id"], b["unique_id"]) for a, b in matches], [("b", "b")])
+        self.assertEqual(list(self.cache.access_log), ["a", "c"])
+        self.assertEqual(list(self.cache.audit_log), ["z"])
+
+    def test_expire(self):
+        self.assertEqual(self.cache.expire(60), [])
+        expired = self.cache.expire(0)
+        self.assertEqual([r["unique_id"] for r in expired], ["a", "b", "c"])
+        self.assertEqual(len(self.cache.access_log), 0)
+        self.assertEqual(len(self.cache.audit_log), 0)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_or_set(self):
+        cache = LRUCache(2)
+        calls = []
+        loader = lambda k: calls.append(k) or k.upper()
+        self.assertEqual(cache.get_or_set("a", loader), "A")
+        self.assertEqual(cache.get_or_set("a", loader), "A")
+        cache.get_or_set("b", loader)
+        cache.get_or_set("a", loader)
+        cache.get_or_set("c", loader)  # evicts b, the least recently used
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(calls, ["a", "b", "c"])
+        self.assertEqual(cache.stats(), {"size": 2, "maxsize": 2, "hits": 2, "misses": 3})
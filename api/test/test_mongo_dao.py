@@ -0,0 +1,187 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from model.geoip_model import GeoIpDao
+from model.sensor_model import SensorDao
+from model.service_model import ServiceDao
+from model.transaction_model import TransactionDao, TransactionRollupDao
+from model.upstream_model import UpstreamDao
+
+
+class TestRelations(unittest.TestCase):
+    def setUp(self):
+        self.sensor, self.other, self.upstream = ObjectId(), ObjectId(), ObjectId()
+        self.descr = {
+            str(i): {"_id": str(i), "name": f"n{n}"} for n, i in enumerate([self.sensor, self.other, self.upstream])
+        }
+
+    def _descr_by_ids(self, ids):
+        return {i: self.descr[i] for i in ids if i in self.descr}
+
+    def test_to_dict_all(self):
+        rows = [
+            {"_id": ObjectId(), "sensor_id": self.sensor, "upstream_id": self.upstream},
+            {"_id": ObjectId(), "sensor_id": self.sensor},
+            {"_id": ObjectId(), "sensor_id": self.other, "service_id": ObjectId()},
+        ]
+        with mock.patch.object(SensorDao, "get_descr_by_ids", side_effect=self._descr_by_ids) as sensors, \
+                mock.patch.object(UpstreamDao, "get_descr_by_ids", side_effect=self._descr_by_ids) as upstreams, \
+                mock.patch.object(ServiceDao, "get_descr_by_ids", side_effect=self._descr_by_ids) as services:
+            TransactionDao()._to_dict_all(rows)
+        # one query per related collection for the whole result set
+        self.assertEqual(sensors.call_count, 1)
+        self.assertEqual(sensors.call_args[0][0], {str(self.sensor), str(self.other)})
+        self.assertEqual((upstreams.call_count, services.call_count), (1, 1))
+        self.assertEqual([r["sensor"]["name"] for r in rows], ["n0", "n0", "n1"])
+        self.assertEqual(rows[0]["upstream"]["name"], "n2")
+        self.assertIsNone(rows[2]["service"])
+        self.assertTrue(all(isinstance(r["_id"], str) and "sensor_id" not in r for r in rows))
+
+    def test_to_dict_single(self):
+        vo = {"_id": ObjectId(), "sensor_id": self.sensor}
+        with mock.patch.object(SensorDao, "get_descr_by_ids", side_effect=self._descr_by_ids) as sensors:
+            TransactionDao()._to_dict(vo)
+        sensors.assert_called_once()
+        self.assertEqual(vo["sensor"], self.descr[str(self.sensor)])
+
+
+class TestDescrCache(unittest.TestCase):
+    def setUp(self):
+        self.ids = [ObjectId(), ObjectId()]
+        self.dao = SensorDao()
+        self.dao.invalidate_descr()
+
+    def test_descr_cache(self):
+        rows = [{"_id": i, "name": f"s{n}"} for n, i in enumerate(self.ids)]
+        with mock.patch.object(self.dao, "collection") as collection:
+            collection.find.return_value = rows
+            collection.find_one.return_value = rows[0]
+            self.assertEqual(self.dao.get_descr_by_ids(self.ids)[str(self.ids[1])]["name"], "s1")
+            self.assertEqual(self.dao.get_descr_by_id(self.ids[0])["name"], "s0")
+            self.dao.get_descr_by_ids(self.ids)
+            self.assertEqual((collection.find.call_count, collection.find_one.call_count), (1, 0))
+            self.dao.invalidate_descr()
+            self.dao.get_descr_by_id(self.ids[0])
+            self.assertEqual(collection.find_one.call_count, 1)
+
+
+class TestGeoIpImport(unittest.TestCase):
+    def _import(self, insert_many, rows):
+        dao = GeoIpDao()
+        with mock.patch("model.geoip_model.MongoDAO") as shadow_dao, mock.patch.object(dao, "collection") as collection:
+            shadow = shadow_dao.return_value
+            shadow.insert_chunks.side_effect = lambda docs, size: GeoIpDao.insert_chunks(shadow, docs, size)
+            shadow.collection.insert_many.side_effect = insert_many
+            collection.index_information.return_value = {}
+            try:
+                return dao.import_ranges(iter(rows), chunk_size=2)
+            finally:
+                self.shadow = shadow.collection
+
+    def test_import(self):
+        total = self._import(lambda docs, ordered: mock.Mock(inserted_ids=[None] * len(docs)), [{}] * 3)
+        self.assertEqual(total, 3)
+        self.shadow.rename.assert_called_once_with("geoip", dropTarget=True)
+
+    def test_failed_import(self):
+        def insert_many(docs, ordered):
+            if len(docs) == 1:
+                raise BulkWriteError({"nInserted": 0, "writeErrors": [{"errmsg": "down"}]})
+            return mock.Mock(inserted_ids=[None] * len(docs))
+
+        for rows in [[{}] * 3, []]:
+            with self.assertRaises(PyMongoError):
+                self._import(insert_many, rows)
+            self.shadow.rename.assert_not_called()
+            self.shadow.drop.assert_called()
+
+
+class TestTransactionPage(unittest.TestCase):
+    def setUp(self):
+        start = datetime(2024, 1, 1, 12, 0)
+        # two transactions share a logtime, the _id breaks the tie
+        self.rows = sorted(
+            [{"_id": ObjectId(), "logtime": start - timedelta(seconds=n // 2)} for n in range(5)],
+            key=lambda r: (r["logtime"], r["_id"]),
+            reverse=True,
+        )
+        self.dao = TransactionDao()
+
+    def _find(self, query, projection):
+        self.assertNotIn("audit", projection or {})
+
+        def after(r):
+            if "$and" not in query:
+                return True
+            logtime, _id = query["$and"][1]["$or"][1]["logtime"], query["$and"][1]["$or"][1]["_id"]["$lt"]
+            return (r["logtime"], r["_id"]) < (logtime, _id)
+
+        cursor = mock.MagicMock()
+        cursor.sort.return_value.limit.side_effect = lambda n: [dict(r) for r in self.rows if after(r)][:n]
+        return cursor
+
+    def test_get_page(self):
+        seen, cursor = [], None
+        with mock.patch.object(self.dao, "collection") as collection:
+            collection.find.side_effect = self._find
+            collection.count_documents.return_value = 5
+            for _ in range(3):
+                page = self.dao.get_page(2, cursor, fields=TransactionDao.LIST_FIELDS, dt_start=self.rows[-1]["logtime"], dt_end=self.rows[0]["logtime"])
+                seen.extend(r["_id"] for r in page["data"])
+                cursor = page["metadata"]["next"]
+            self.assertIsNone(cursor)
+            self.assertIsNone(page["metadata"]["total_elements"])
+            page = self.dao.get_page(2, dt_start=self.rows[-1]["logtime"], dt_end=self.rows[0]["logtime"], with_count=True)
+            self.assertEqual(page["metadata"]["total_elements"], 5)
+        self.assertEqual(seen, [str(r["_id"]) for r in self.rows])
+
+    def test_cursor(self):
+        row = self.rows[0]
+        self.assertEqual(TransactionDao.decode_cursor(TransactionDao.encode_cursor(row)), (row["logtime"], row["_id"]))
+        with self.assertRaises(ValueError):
+            TransactionDao.decode_cursor("bm90IGEgY3Vyc29y")
+
+    def test_projection(self):
+        self.assertEqual(TransactionDao.projection(["http", "http.request.headers", "service.name"]),
+                         {"logtime": 1, "http": 1, "service_id": 1})
+        self.assertNotIn("http.request.headers", TransactionDao.projection(TransactionDao.LIST_FIELDS))
+        self.assertIsNone(TransactionDao.projection())
+
+
+class TestRollup(unittest.TestCase):
+    def test_rollup(self):
+        service = str(ObjectId())
+        logtime = datetime(2024, 1, 1, 12, 0, 5)
+        summaries = [
+            {"logtime": logtime + timedelta(seconds=n), "meta": {"server_id": "n1", "service_id": service},
+             "action": "PASSED", "bytes_in": 10, "bytes_out": 100, "duration": d}
+            for n, d in enumerate([0.005, 0.2, 0.3])
+        ]
+        summaries.append(dict(summaries[0], logtime=logtime + timedelta(minutes=1)))
+        transactions = [{"logtime": logtime, "server_id": "n1", "service": {"_id": service}, "action": "PASSED"}]
+        dao, trn_dao = TransactionRollupDao(), TransactionDao()
+        with mock.patch.object(dao, "collection") as collection, mock.patch.object(trn_dao, "collection"):
+            # rollups are built from the batch as left by persist_batch, like LogParserTool.flush does
+            trn_dao.persist_batch(transactions)
+            dao.rollup(summaries, transactions)
+        ops = {op._filter["minute"].minute: op._doc["$inc"] for op in collection.bulk_write.call_args[0][0]}
+        self.assertEqual({op._filter["service_id"] for op in collection.bulk_write.call_args[0][0]}, {ObjectId(service)})
+        self.assertEqual(ops[0], {
+            "count": 3, "bytes_in": 30, "bytes_out": 300, "duration_sum": 0.505,
+            "latency.le_10ms": 1, "latency.le_250ms": 1, "latency.le_500ms": 1, "trn_count": 1,
+        })
+        self.assertEqual(ops[1]["count"], 1)
+
+    def test_tpm_source(self):
+        dt = datetime(2024, 1, 1)
+        with mock.patch.object(TransactionRollupDao, "get_tpm", return_value=[]) as rollup:
+            dao = TransactionDao()
+            with mock.patch.object(dao, "collection") as collection:
+                dao.get_tpm(dt, dt, [{"action": "DENY"}])
+                rollup.assert_called_once_with(dt, dt, {"action": "DENY"})
+                dao.get_tpm(dt, dt, [{"source.ip": "1.1.1.1"}])
+                collection.aggregate.assert_called_once()
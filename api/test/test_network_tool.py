@@ -42,11 +42,30 @@ class TestNetworkTool(unittest.TestCase):
             "2001:0db8:0000:0000:0000:0000:0000:0001",
         )
         
+    def test_id(self):
+        self.assertEqual(NetworkTool.id("192.168.1.1"), 0xC0A80101)
+        self.assertEqual(NetworkTool.id("::1"), b"\x00" * 15 + b"\x01")
+        self.assertEqual(NetworkTool.ip_from_id(NetworkTool.id(self.ipv6_public)), self.ipv6_public)
+        self.assertEqual(NetworkTool.id_from_legacy("192.168.001.001"), NetworkTool.id("192.168.1.1"))
+        self.assertEqual(
+            NetworkTool.id_from_legacy("2001:0db8:0000:0000:0000:0000:0000:0001"),
+            NetworkTool.id("2001:db8::1"),
+        )
+
     def test_range_from_network(self):
         result = NetworkTool.range_from_network("192.168.1.0/24")
-        self.assertEqual(result["net_start"], "192.168.001.000")
-        self.assertEqual(result["net_end"], "192.168.001.255")
+        self.assertEqual(result["net_start"], NetworkTool.id("192.168.1.0"))
+        self.assertEqual(result["net_end"], NetworkTool.id("192.168.1.255"))
         self.assertEqual(result["version"], 4)
+        result = NetworkTool.range_from_network("2001:db8::/32")
+        self.assertEqual(NetworkTool.ip_from_id(result["net_end"]), "2001:db8:ffff:ffff:ffff:ffff:ffff:ffff")
+        self.assertEqual(result["version"], 6)
+
+    def test_aggregate(self):
+        self.assertEqual(
+            NetworkTool.aggregate(["10.0.0.0/8", "10.1.0.0/16", "192.168.1.1/32", "192.168.0.0/16", "2001:db8::/32"]),
+            ["10.0.0.0/8", "192.168.0.0/16", "2001:db8::/32"],
+        )
 
     def test_calc_prefix_from_range(self):
         self.assertEqual(
@@ -0,0 +1,89 @@
+import unittest
+
+from tools.network_tool import NetworkTool
+from tools.rbl_tool import RBLIndex
+
+
+class TestRBLIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = RBLIndex()
+        rows = []
+        for net, provider, action in [
+            ("10.0.0.0/8", "feed_a", "deny"),
+            ("10.1.0.0/16", "feed_a", "deny"),
+            ("192.168.1.0/24", "feed_b", "deny"),
+            ("192.168.1.10/32", "allow", "pass"),
+            ("2001:db8::/32", "feed_a", "deny"),
+        ]:
+            r = NetworkTool.range_from_network(net)
+            r.update({"provider_id": provider, "action": action})
+            rows.append(r)
+        self.index.load(rows)
+
+    def _blocked(self, ip, permit, deny, index=None):
+        v = 4 if NetworkTool.is_ipv4(ip) else 6
+        return (index or self.index).is_blocked(v, NetworkTool.id(ip), permit, deny)
+
+    def test_merge_ranges(self):
+        starts, ends = RBLIndex.merge_ranges([(6, 9), (1, 3), (2, 4), (7, 8), (12, 14)])
+        self.assertEqual(starts, [1, 6, 12])
+        self.assertEqual(ends, [4, 9, 14])
+        # adjacent ranges are merged too
+        starts, ends = RBLIndex.merge_ranges([(5, 9), (1, 4)])
+        self.assertEqual((starts, ends), ([1], [9]))
+
+    def test_collapse(self):
+        rows = []
+        for net in ["10.0.0.0/25", "10.0.0.128/25", "10.0.0.7/32", "2001:db8::/33", "2001:db8:8000::/33"]:
+            r = NetworkTool.range_from_network(net)
+            r["action"] = "deny"
+            rows.append(r)
+        collapsed = RBLIndex.collapse(rows)
+        self.assertEqual(
+            [(NetworkTool.ip_from_id(r["net_start"]), NetworkTool.ip_from_id(r["net_end"])) for r in collapsed],
+            [("10.0.0.0", "10.0.0.255"), ("2001:db8::", "2001:db8:ffff:ffff:ffff:ffff:ffff:ffff")],
+        )
+
+    def test_views(self):
+        plain = RBLIndex(merged_views=False)
+        plain._tables = self.index._tables
+        for ip in ["10.200.3.4", "192.168.1.10", "192.168.1.11", "11.0.0.1", "2001:db8::1"]:
+            for permit, deny in [([], ["feed_a", "feed_b"]), (["allow"], ["feed_b"])]:
+                self.assertEqual(self._blocked(ip, permit, deny), self._blocked(ip, permit, deny, plain))
+
+    def test_deny(self):
+        self.assertTrue(self._blocked("10.200.3.4", [], ["feed_a"]))
+        self.assertTrue(self._blocked("2001:db8::1", [], ["feed_a"]))
+        self.assertFalse(self._blocked("11.0.0.1", [], ["feed_a"]))
+        self.assertFalse(self._blocked("192.168.1.20", [], ["feed_a"]))
+
+    def test_pass_precedence(self):
+        self.assertTrue(self._blocked("192.168.1.10", [], ["feed_b"]))
+        self.assertFalse(self._blocked("192.168.1.10", ["allow"], ["feed_b"]))
+        self.assertTrue(self._blocked("192.168.1.11", ["allow"], ["feed_b"]))
+
+    def test_load_provider(self):
+        self.index.load_provider("feed_b", [])
+        self.assertFalse(self._blocked("192.168.1.20", [], ["feed_b"]))
+        self.assertTrue(self._blocked("10.0.0.1", [], ["feed_a"]))
+
+    def test_load_provider_views(self):
+        self._blocked("10.0.0.1", [], ["feed_a"])
+        self._blocked("10.0.0.1", [], ["feed_b"])
+        rows = [dict(NetworkTool.range_from_network("192.168.1.0/24"), provider_id="feed_b", action="deny")]
+        # an unchanged reload keeps every view
+        self.index.load_provider("feed_b", rows)
+        views = dict(self.index._views)
+        self.assertEqual(len(views), 3)
+        rows.append(dict(NetworkTool.range_from_network("172.16.0.0/12"), provider_id="feed_b", action="deny"))
+        self.index.load_provider("feed_b", rows)
+        self.assertEqual({k: v for k, v in views.items() if "feed_b" not in k[1]}, self.index._views)
+        self.assertTrue(self._blocked("172.16.0.1", [], ["feed_b"]))
+
+    def test_jails(self):
+        ban = dict(NetworkTool.range_from_network("11.0.0.1/32"), provider_id="jail", action="deny")
+        self.index.load_provider("jail", [ban])
+        v, ip_id = 4, NetworkTool.id("11.0.0.1")
+        self.assertTrue(self.index.is_blocked(v, ip_id, [], ["feed_a"], ["jail"]))
+        self.assertFalse(self.index.is_blocked(v, ip_id, [], ["feed_a"]))
+        self.assertFalse(any("jail" in k[1] for k in self.index._views))
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from tools.tail_tool import TailedFile
+
+
+class TestTailedFile(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "access_log-test.log")
+        with open(self.path, "w") as f:
+            f.write("old\n")
+        self.tailed = TailedFile(self.path, None)
+        self.tailed.open(from_end=True)
+
+    def tearDown(self):
+        self.tailed.close()
+
+    def _write(self, data, path=None):
+        with open(path or self.path, "a") as f:
+            f.write(data)
+
+    def test_partial_lines(self):
+        self._write("one\ntw")
+        self.assertEqual(self.tailed.read_lines(), ["one"])
+        self._write("o\n")
+        self.assertEqual(self.tailed.read_lines(), ["two"])
+
+    def test_rotation(self):
+        self._write("one\n")
+        os.rename(self.path, self.path + ".1")
+        self._write("two\n")
+        self.assertTrue(self.tailed.is_rotated())
+        self.assertEqual(self.tailed.read_lines(), ["one"])
+        self.tailed.open(from_end=False)
+        self.assertEqual(self.tailed.read_lines(), ["two"])
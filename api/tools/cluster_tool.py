@@ -10,10 +10,13 @@ import psutil
 import requests
 
 from common_utils import logger, get_server_id, API_HEADERS, replace_tz
+from model.mongo_base_model import MongoDAO
+from model.rbl_model import RBLDao
 from model.upstream_model import UpstreamDao, NodeStatusDao
 from tools.engine_tool import EngineManager
 from tools.network_tool import NetworkTool
-from tools.service_watcher import ServiceWatcher
+from tools.ingest_tool import IngestPipeline
+from tools.jail_tool import JailTool
 from config import (
     APP_BASE,
     ENGINE_VERSION,
@@ -24,7 +27,7 @@ from config import (
 class ClusterTool:
     CONFIG = None
     APPLY_ACTIVE = False
-    service_watchers = []
+    ingest = IngestPipeline()
 
     @classmethod
     def check_tcp_port(cls, host, port):
@@ -58,6 +61,9 @@ class ClusterTool:
                         }
                     )
                     manager.flush_feeds()
+                    RBLDao().sync_index()
+                    JailTool.configure(cls.CONFIG)
+                    MongoDAO.invalidate_descr()
                     cls.restart()
 
         except Exception:
@@ -79,7 +85,10 @@ class ClusterTool:
                         f"Replicate {cls.CONFIG['scn']} -> {manager.CONFIG['scn']}"
                     )
                     cls.CONFIG = manager.CONFIG
-                    cls.restart(fully=True)
+                    RBLDao().load_index()
+                    JailTool.configure(cls.CONFIG)
+                    MongoDAO.invalidate_descr()
+                    cls.restart()
 
     @classmethod
     def __eval_upstream(cls, upstream, ngx_status):
@@ -153,20 +162,14 @@ class ClusterTool:
 
     @classmethod
     def stop_log_monitor(cls):
-        for t in cls.service_watchers:
-            t.stop()
-        cls.service_watchers = []
+        cls.ingest.stop()
 
     @classmethod
     def start_log_monitor(cls):
+        """Start the ingest pipeline if needed and follow the services of the active config."""
         manager = EngineManager()
-        if "services" in manager.CONFIG:
-            for service in manager.CONFIG["services"]:
-                watcher = ServiceWatcher(service)
-                cls.service_watchers.append(watcher)
-
-            for w in cls.service_watchers:
-                w.start()
+        cls.ingest.start()
+        cls.ingest.sync_services(manager.CONFIG.get("services", []))
 
     @classmethod
     def is_running(cls):
@@ -186,10 +189,7 @@ class ClusterTool:
         return False
 
     @classmethod
-    def restart(cls, fully=False):
-        if fully:
-            cls.stop_log_monitor()
-
+    def restart(cls):
         cls.run = subprocess.run(f"sudo chmod -R 777 {APP_BASE}/logs", shell=True)
         if cls.is_running():
             logger.info(f"Nginx is running, reload required")
@@ -219,8 +219,7 @@ class ClusterTool:
         stdout, stderr = result.communicate()
         cls.run = subprocess.run(f"sudo chmod -R 777 {APP_BASE}/logs", shell=True)
         if result.returncode == 0:
-            if fully:
-                cls.start_log_monitor()
+            cls.start_log_monitor()
             return {"succeed": True}
         else:
             return {"succeed": False, "message": stderr.decode()}
@@ -232,11 +231,12 @@ class ClusterTool:
             manager = EngineManager()
             if reconfigure:
                 manager.flush_config()
-                restart_result = cls.restart(fully=True)
-            else:
-                restart_result = cls.restart()
+            restart_result = cls.restart()
             if restart_result["succeed"]:
                 cls.CONFIG = manager.CONFIG
+                RBLDao().load_index()
+                JailTool.configure(cls.CONFIG)
+                MongoDAO.invalidate_descr()
                 logger.info(f"Engine active with scn {cls.CONFIG['scn']}")
                 with open(f"{APP_BASE}/run/activated.config", "wb") as f:
                     pickle.dump(cls.CONFIG, f)  # SAVE START_CONFIG
@@ -0,0 +1,64 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common_utils import logger
+from config import FEED_DOWNLOAD_TIMEOUT, FEED_DOWNLOAD_WORKERS
+
+
+class DownloadTool:
+    """Concurrent downloads for the feed update window.
+
+    Jobs share one connection-pooled session and run on a bounded thread
+    pool, so a slow provider only holds its own worker. Requests are
+    conditional when the caller has the validators (ETag/Last-Modified) of
+    the previous download.
+    """
+
+    def __init__(self, workers=FEED_DOWNLOAD_WORKERS, timeout=FEED_DOWNLOAD_TIMEOUT):
+        self.workers = max(workers, 1)
+        self.timeout = (min(10, timeout), timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def validators(cls, resp) -> Dict[str, Optional[str]]:
+        return {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+
+    def get(self, url, state: Optional[Dict[str, Any]] = None):
+        """Streamed GET of url, conditional on the etag/last_modified of state."""
+        headers = {}
+        if state and state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state and state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+
+    def run_all(self, jobs: Dict[str, Callable[["DownloadTool"], Any]]) -> Dict[str, Dict[str, Any]]:
+        """Run job(self) for every named job, returning their result, error and duration (ms)."""
+
+        def timed(name, job):
+            started = time.perf_counter()
+            result, error = None, None
+            try:
+                result = job(self)
+            except Exception as e:
+                error = str(e)
+                logger.error(f"[download] {name} failed: {e}")
+                logger.error(traceback.format_exc())
+            duration = round((time.perf_counter() - started) * 1000.0, 2)
+            logger.info(f"[download] {name} done in {duration} ms")
+            return {"result": result, "error": error, "duration": duration}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as pool:
+                futures = {name: pool.submit(timed, name, job) for name, job in jobs.items()}
+                return {name: f.result() for name, f in futures.items()}
+        finally:
+            self.session.close()
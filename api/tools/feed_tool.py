@@ -1,85 +1,36 @@
 import csv
 import gzip
+import hashlib
 import io
+import json
 import os
-import re
 import tarfile
+import time
 import traceback
-from datetime import datetime, timedelta
+import zlib
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
 from zipfile import ZipFile
 
-import geoip2.database
 import requests
-from bson import ObjectId
 from marshmallow import ValidationError
 
-from common_utils import logger, replace_tz
+from common_utils import logger
 from model.config_model import ConfigDao
 from model.feed_model import FeedDao
 from model.geoip_model import GeoIpDao
-from model.jail_model import JailDao
 from model.rbl_model import RBLDao
 from model.seclang_model import RuleCategoryDao, RuleCategorySchema, RuleDao
 from model.sensor_model import SensorDao
-from model.transaction_model import TransactionDao
+from tools.download_tool import DownloadTool
+from tools.geoip_tool import GeoIpResolver
 from tools.network_tool import NetworkTool
+from tools.rbl_tool import RBLIndex
 from tools.ruleset_tool import RuleSetParser
 from config import APP_BASE, TZ
 
 
-class JailTool:
-
-    @classmethod
-    def calc_process_jails(cls):
-        now_dt = replace_tz(datetime.now())
-        dao = JailDao()
-        trn_dao = TransactionDao()
-        sensor_dao = SensorDao()
-        rbl_dao = RBLDao()
-        for j in dao.get_all()["data"]:
-            sensor_ids = sensor_dao.get_ids_by_jail(j["_id"])
-            if sensor_ids and len(sensor_ids) > 0:
-                transactions = trn_dao.get_last_n_minutes(
-                    j["interval"], sensor_ids=sensor_ids
-                )
-                cs = {}
-                for t in transactions:
-                    source_ip = t["source"]["ip"]
-                    if source_ip not in cs:  # register source ip
-                        cs[source_ip] = 0
-                    for rule in j["rules"]:
-                        if "src.header" in rule["field"]:
-                            pattern = re.compile(rule["regex"], re.IGNORECASE)
-                            for h in t["http"]["request"]["headers"]:
-                                if pattern.search(h["content"]):
-                                    cs[source_ip] += 1
-                        if "src.request_line" in rule["field"]:
-                            if re.search(rule["regex"], t["http"]["request_line"]):
-                                cs[source_ip] += 1
-                        if "status_code" in rule["field"]:
-                            if re.search(
-                                rule["regex"], t["http"]["response"]["status_code"]
-                            ):
-                                cs[source_ip] += 1
-                for ip, score in cs.items():
-                    if score >= j["occurrence"]:
-                        b = NetworkTool.range_from_network(ip)
-                        b.update(
-                            {
-                                "provider_type": "jail",
-                                "provider_id": ObjectId(j["_id"]),
-                                "action": "deny",
-                            }
-                        )
-                        ck_upd = rbl_dao.update_by_query(b, {"banned_on": now_dt})
-                        if not ck_upd:
-                            b.update({"banned_on": now_dt})
-                            rbl_dao.persist(b)
-            rbl_dao.delete_expired(
-                "jail", j["_id"], now_dt - timedelta(minutes=j["bantime"])
-            )
-
-
 class RuleSetTool:
     @classmethod
     def _download_crs(cls, feed_config):
@@ -172,162 +123,223 @@ class RuleSetTool:
 
 class SecurityFeedTool:
 
+    geoip = GeoIpResolver()
+
     @classmethod
     def update(cls):
         dao = ConfigDao()
         conf = dao.get_active()
 
-        cls.download_ip2asn()
+        jobs = {"ip2asn": partial(cls.download_ip2asn, "ip2asn-combined")}
         if "maxmind_key" in conf and len(conf["maxmind_key"]) > 0:
-            cls.download_mmdb(conf["maxmind_key"], "GeoLite2-ASN")
-            cls.download_mmdb(conf["maxmind_key"], "GeoLite2-City")
+            for edition_id in ["GeoLite2-ASN", "GeoLite2-City"]:
+                jobs[edition_id] = partial(cls.download_mmdb, conf["maxmind_key"], edition_id)
 
         feed_dao = FeedDao()
         for feed in feed_dao.get_by_type("network"):
             if "source" in feed and len(feed["source"]) > 1:
-                try:
-                    source_url = feed["source"]
-                    rbl_dao = RBLDao()
-                    if feed["restricted"]:
-                        if "iblocklist" in feed["provider"]:
-                            if (
-                                "iblocklist_username" in conf
-                                and len(conf["iblocklist_username"]) > 0
-                            ):
-                                source_url = f"{source_url}&username={conf['iblocklist_username']}&pin={conf['iblocklist_pin']}"
-                            else:
-                                logger.info(
-                                    f"Feed {feed['name']} skipped, no credentials"
-                                )
-                                continue
+                jobs[f"feed {feed['slug']}"] = partial(cls._feed_job, conf, feed)
 
-                    resp = requests.get(source_url)
-                    if resp and resp.status_code == 200:
-                        lines = []
-                        if "cdir_text" in feed["format"]:
-                            lines = resp.text.splitlines()
-                        if "cdir_gz" in feed["format"]:
-                            with gzip.GzipFile(fileobj=io.BytesIO(resp.content)) as gz:
-                                for l in gz:
-                                    lines.append(l.decode("utf-8").strip())
-                        rbl_dao.delete_by_provider("feed", feed["_id"])
-                        fc = 0
-                        for line in lines:
-                            if line.strip() and "#" not in line:
-                                if NetworkTool.is_network(line):
-                                    rbl = dict(NetworkTool.range_from_network(line))
-                                    ip_v = (
-                                        4
-                                        if NetworkTool.is_ipv4(line.split("/")[0])
-                                        else 6
-                                    )
-                                    rbl.update(
-                                        {
-                                            "version": ip_v,
-                                            "provider_type": "feed",
-                                            "provider_id": ObjectId(feed["_id"]),
-                                            "action": feed["action"],
-                                        }
-                                    )
-                                    rbl_dao.persist(rbl)
-                                    fc += 1
+        DownloadTool().run_all(jobs)
 
-                        feed_dao.update_by_id(
-                            feed["_id"], {"updated_on": datetime.now(TZ)}
-                        )
-                        logger.info(
-                            f"Update Security IP feeds {feed['name']} with {fc} records"
-                        )
-                except Exception as e:
-                    logger.error(f"Failed to load {feed['slug']}: %s", e)
-                    logger.error(traceback.format_exc())
+    @classmethod
+    def _feed_job(cls, conf, feed, downloader):
+        started = time.perf_counter()
+        status = None
+        try:
+            status = cls.update_feed(conf, feed, downloader)
+        except Exception as e:
+            status = "error"
+            logger.error(f"Failed to load {feed['slug']}: %s", e)
+            logger.error(traceback.format_exc())
+        finally:
+            FeedDao().update_by_id(
+                feed["_id"],
+                {
+                    "last_download": {
+                        "on": datetime.now(TZ),
+                        "status": status,
+                        "duration": round((time.perf_counter() - started) * 1000.0, 2),
+                    }
+                },
+            )
+        return status
 
     @classmethod
-    def download_ip2asn(cls, feed="ip2asn-combined"):
-        response = requests.get(f"https://iptoasn.com/data/{feed}.tsv.gz")
-        if response.status_code == 200:
-            dao = GeoIpDao()
-            dao.delete_all()
-            zip_content = io.BytesIO(response.content)
-            with gzip.open(zip_content, "rt", encoding="utf-8") as file:
-                reader = csv.reader(file, delimiter="\t")
-                batch = []
-                for row in reader:
-                    try:
-                        r = {
-                            "as_number": row[2],
-                            "country_code": row[3],
-                            "as_description": row[4],
-                            "source": "ip2asn",
-                            "version": 4 if NetworkTool.is_ipv4(row[0]) else 6,
-                            "network": f"{row[0]}/{NetworkTool.calc_prefix_from_range(row[0], row[1])}",
-                        }
-                        r.update(NetworkTool.range_from_network(r["network"]))
-                        batch.append(r)
-                    except Exception as e:
-                        logger.error(f"Failed parse {r}: %s", e)
-                        logger.error(traceback.format_exc())
-                dao.persist_many(batch)
-                logger.info(f"Download {feed} with {len(batch)} records")
+    def update_feed(cls, conf, feed, downloader=None):
+        """Download a network feed and sync its RBL entries, returning the outcome."""
+        downloader = downloader or DownloadTool()
+        feed_dao = FeedDao()
+        rbl_dao = RBLDao()
+        source_url = feed["source"]
+        if feed["restricted"]:
+            if "iblocklist" in feed["provider"]:
+                if (
+                    "iblocklist_username" in conf
+                    and len(conf["iblocklist_username"]) > 0
+                ):
+                    source_url = f"{source_url}&username={conf['iblocklist_username']}&pin={conf['iblocklist_pin']}"
+                else:
+                    logger.info(
+                        f"Feed {feed['name']} skipped, no credentials"
+                    )
+                    return "skipped"
+
+        state = feed.get("source_state") or {}
+        if state.get("source") != feed["source"] or state.get("action") != feed["action"]:
+            state = {}
+
+        with downloader.get(source_url, state) as resp:
+            if resp.status_code == 304:
+                logger.info(f"Feed {feed['name']} not modified")
+                return "not_modified"
+            if resp.status_code != 200:
+                logger.error(f"Failed to download {feed['name']} {resp}")
+                return f"http_{resp.status_code}"
+            digest = hashlib.sha256()
+            ranges = RBLIndex.collapse(cls.feed_ranges(cls.feed_lines(resp, feed["format"], digest), feed["action"]))
+
+        source_state = {
+            "source": feed["source"],
+            "action": feed["action"],
+            "content_hash": digest.hexdigest(),
+        }
+        source_state.update(DownloadTool.validators(resp))
+        if source_state["content_hash"] == state.get("content_hash"):
+            feed_dao.update_by_id(feed["_id"], {"source_state": source_state})
+            logger.info(f"Feed {feed['name']} unchanged")
+            return "unchanged"
+
+        fc = rbl_dao.sync_provider("feed", feed["_id"], ranges)
+        feed_dao.update_by_id(
+            feed["_id"], {"updated_on": datetime.now(TZ), "source_state": source_state}
+        )
+        rbl_dao.load_index(feed["_id"])
+        logger.info(
+            f"Update Security IP feeds {feed['name']} with {fc['total']} records "
+            f"({fc['inserted']} added, {fc['deleted']} removed)"
+        )
+        return "updated"
+
+    @classmethod
+    def feed_lines(cls, resp, feed_format, digest=None):
+        """Yield the text lines of a streamed feed download, feeding digest with the raw body."""
+        gz = "cdir_gz" in feed_format
+        if not gz and "cdir_text" not in feed_format:
+            return
+        inflate = zlib.decompressobj(zlib.MAX_WBITS | 16) if gz else None
+        pending = b""
+        for chunk in resp.iter_content(chunk_size=65536):
+            if digest:
+                digest.update(chunk)
+            if inflate:
+                data = inflate.decompress(chunk)
+                while inflate.eof and inflate.unused_data:  # concatenated gzip members
+                    rest = inflate.unused_data
+                    inflate = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                    data += inflate.decompress(rest)
+                chunk = data
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for l in lines:
+                yield l.decode("utf-8", errors="ignore")
+        if inflate:
+            pending += inflate.flush()
+        for l in pending.split(b"\n"):
+            yield l.decode("utf-8", errors="ignore")
+
+    @classmethod
+    def feed_ranges(cls, lines, action):
+        """Yield the rbl range of every network line, parsing each line once."""
+        for line in lines:
+            line = line.strip()
+            if not line or "#" in line:
+                continue
+            try:
+                rbl = NetworkTool.range_from_network(line)
+            except ValueError:
+                continue
+            rbl["action"] = action
+            yield rbl
+
+    @classmethod
+    def download_ip2asn(cls, feed="ip2asn-combined", downloader=None):
+        downloader = downloader or DownloadTool()
+        dao = GeoIpDao()
+        state_file = f"{APP_BASE}/data/{feed}.json"
+        state = None
+        if os.path.exists(state_file) and dao.get_stamp():
+            with open(state_file, "r") as f:
+                state = json.load(f)
+        with downloader.get(f"https://iptoasn.com/data/{feed}.tsv.gz", state) as response:
+            if response.status_code == 304:
+                logger.info(f"Download {feed} not modified")
+                return
+            if response.status_code != 200:
+                logger.error(f"Failed to download {feed} {response}")
+                return
+            validators = DownloadTool.validators(response)
+            response.raw.decode_content = True
+            with gzip.open(response.raw, "rt", encoding="utf-8") as file:
+                total = dao.import_ranges(cls.ip2asn_rows(csv.reader(file, delimiter="\t")))
+            logger.info(f"Download {feed} with {total} records")
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        with open(state_file, "w") as f:
+            json.dump(validators, f)
+        cls.geoip.refresh(force=True)
 
     @classmethod
-    def download_mmdb(cls, key, edition_id):
+    def ip2asn_rows(cls, reader):
+        """Yield the geoip documents of the ip2asn tsv rows."""
+        for row in reader:
+            try:
+                r = {
+                    "as_number": row[2],
+                    "country_code": row[3],
+                    "as_description": row[4],
+                    "source": "ip2asn",
+                    "network": f"{row[0]}/{NetworkTool.calc_prefix_from_range(row[0], row[1])}",
+                }
+                r.update(NetworkTool.range_from_network(r["network"]))
+                yield r
+            except Exception as e:
+                logger.error(f"Failed parse {row}: %s", e)
+
+    @classmethod
+    def download_mmdb(cls, key, edition_id, downloader=None):
+        downloader = downloader or DownloadTool()
         url = f"https://download.maxmind.com/geoip_download?edition_id={edition_id}&license_key={key}&suffix=tar.gz"
-        logger.info(f"{url}")
-        response = requests.get(url)
-        if response.status_code == 200:
-            zip_content = io.BytesIO(response.content)
-            with tarfile.open(fileobj=zip_content, mode="r:gz") as tar:
-                for m in tar.getmembers():
-                    if ".mmdb" in m.name:
-                        tar.extract(m, path=f"{APP_BASE}/data")
-                        os.rename(
-                            f"{APP_BASE}/data/{m.name}",
-                            f"{APP_BASE}/data/{edition_id}.mmdb",
-                        )
-                        os.rmdir(f"{APP_BASE}/data/{m.name.split('/')[0]}")
-        else:
-            logger.error(f"Failed to download {edition_id} {response}")
+        mmdb_file = f"{APP_BASE}/data/{edition_id}.mmdb"
+        state = None
+        if os.path.exists(mmdb_file):
+            state = {"last_modified": formatdate(os.path.getmtime(mmdb_file), usegmt=True)}
+        logger.info(f"Download {edition_id}")
+        with downloader.get(url, state) as response:
+            if response.status_code == 304:
+                logger.info(f"[update] {edition_id} not modified")
+                return
+            if response.status_code != 200:
+                logger.error(f"Failed to download {edition_id} {response}")
+                return
+            content = response.content
+            last_modified = response.headers.get("Last-Modified")
+        with tarfile.open(fileobj=io.BytesIO(content), mode="r:gz") as tar:
+            for m in tar.getmembers():
+                if ".mmdb" in m.name:
+                    tar.extract(m, path=f"{APP_BASE}/data")
+                    os.rename(f"{APP_BASE}/data/{m.name}", mmdb_file)
+                    os.rmdir(f"{APP_BASE}/data/{m.name.split('/')[0]}")
+        if last_modified:
+            # the next download is conditional on the file mtime
+            mtime = parsedate_to_datetime(last_modified).timestamp()
+            os.utime(mmdb_file, (mtime, mtime))
+        cls.geoip.load_mmdb()
         logger.info(f"[update] Download {edition_id}")
 
     @classmethod
     def geo_info(cls, ip):
-        ip_info = {}
-        model = GeoIpDao()
-        ip_asn = model.find_by_ip(ip)
-        if ip_asn:
-            ip_info.update(
-                {
-                    "net_start": ip_asn["net_start"],
-                    "net_end": ip_asn["net_end"],
-                    "ans_number": ip_asn["as_number"],
-                    "organization": ip_asn["as_description"],
-                    "country": ip_asn["country_code"],
-                }
-            )
-        for db in ["ASN", "City"]:
-            if os.path.exists(f"{APP_BASE}/data/GeoLite2-{db}.mmdb"):
-                with geoip2.database.Reader(
-                    f"{APP_BASE}/data/GeoLite2-{db}.mmdb"
-                ) as reader:
-                    try:
-                        if "ASN" in db:
-                            response_asn = reader.asn(ip)
-                            ip_info.update(
-                                {
-                                    "ans_number": response_asn.autonomous_system_number,
-                                    "organization": response_asn.autonomous_system_organization,
-                                }
-                            )
-                        if "City" in db:
-                            response_city = reader.city(ip)
-                            ip_info.update(
-                                {
-                                    "country": response_city.country.iso_code,
-                                    "latitude": response_city.location.latitude,
-                                    "longitude": response_city.location.longitude,
-                                }
-                            )
-                    except Exception:
-                        pass
-        return ip_info
+        return cls.geo_info_many([ip])[ip]
+
+    @classmethod
+    def geo_info_many(cls, ips):
+        return cls.geoip.lookup_many(ips)
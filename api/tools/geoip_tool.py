@@ -0,0 +1,160 @@
+import os
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+
+import geoip2.database
+
+from common_utils import LRUCache, logger
+from config import APP_BASE, GEOIP_CACHE_SIZE, GEOIP_CACHE_TTL
+from model.geoip_model import GeoIpDao
+from tools.network_tool import NetworkTool
+
+
+class GeoIpResolver:
+    """Long lived GeoIP lookups for log ingestion and the sensor endpoints.
+
+    The ip2asn ranges of the ``geoip`` collection are kept as sorted
+    start/end lists per IP version and the GeoLite2 databases stay
+    memory-mapped between calls. Both sources are reloaded by ``refresh``
+    when their stamp changes (newest ``geoip`` document, mmdb file
+    inode/mtime); it runs from the scheduler, never from a lookup, and
+    lookups before the first load return no data. Results are kept in a
+    bounded TTL cache that is cleared on every reload.
+    """
+
+    MMDB = ["ASN", "City"]
+
+    def __init__(self, data_dir=f"{APP_BASE}/data", cache_size=GEOIP_CACHE_SIZE, cache_ttl=GEOIP_CACHE_TTL):
+        self.data_dir = data_dir
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.table_stamp = None
+        self.readers = {}
+
+    @classmethod
+    def build_table(cls, rows) -> Dict[int, tuple]:
+        """Group ip2asn rows into (starts, ends, infos) lists sorted by net_start."""
+        grouped = {}
+        shared = {}  # the same AS shows up in thousands of ranges
+        for r in rows:
+            info = (r.get("as_number"), r.get("as_description"), r.get("country_code"))
+            grouped.setdefault(r["version"], []).append((
+                r["net_start"],
+                r["net_end"],
+                shared.setdefault(info, info),
+            ))
+        tables = {}
+        for version, ranges in grouped.items():
+            ranges.sort(key=lambda t: t[0])
+            tables[version] = tuple(list(col) for col in zip(*ranges))
+        return tables
+
+    def load_table(self, stamp=None) -> int:
+        """Reload the ip2asn ranges from Mongo, returning the number of ranges."""
+        dao = GeoIpDao()
+        stamp = stamp or dao.get_stamp()
+        tables = self.build_table(dao.get_ranges())
+        with self.lock:
+            self.tables = tables
+            self.table_stamp = stamp
+        self.cache.clear()
+        total = sum(len(t[0]) for t in tables.values())
+        logger.info(f"[geoip] ip2asn table loaded with {total} ranges")
+        return total
+
+    def _mmdb_path(self, db):
+        return f"{self.data_dir}/GeoLite2-{db}.mmdb"
+
+    def load_mmdb(self) -> None:
+        """Open the GeoLite2 databases whose file changed since they were mapped."""
+        changed = False
+        # held from the copy to the swap, the ASN and City downloads refresh concurrently
+        with self.lock:
+            readers = dict(self.readers)
+            for db in self.MMDB:
+                path = self._mmdb_path(db)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    changed = changed or readers.pop(db, None) is not None
+                    continue
+                stamp = (st.st_ino, st.st_mtime)
+                if db in readers and readers[db][0] == stamp:
+                    continue
+                try:
+                    readers[db] = (stamp, geoip2.database.Reader(path, mode=geoip2.database.MODE_MMAP))
+                    changed = True
+                    logger.info(f"[geoip] mapped {path}")
+                except Exception as e:
+                    logger.error(f"[geoip] failed to open {path}: {e}")
+            if changed:
+                # replaced readers are released with their last reference, a lookup
+                # running on the old mapping finishes on it
+                self.readers = readers
+        if changed:
+            self.cache.clear()
+
+    def refresh(self, force=False) -> None:
+        """Reload the sources whose stamp changed."""
+        try:
+            stamp = GeoIpDao().get_stamp()
+            if force or stamp != self.table_stamp:
+                self.load_table(stamp)
+        except Exception as e:
+            logger.error(f"[geoip] failed to load ip2asn table: {e}")
+        self.load_mmdb()
+
+    def _find_range(self, ip) -> Optional[Dict[str, Any]]:
+        ip_id = NetworkTool.id(ip)
+        table = self.tables.get(4 if isinstance(ip_id, int) else 6)
+        if not table:
+            return None
+        starts, ends, infos = table
+        i = bisect_right(starts, ip_id) - 1
+        if i < 0 or ends[i] < ip_id:
+            return None
+        as_number, as_description, country_code = infos[i]
+        return {
+            "net_start": NetworkTool.ip_from_id(starts[i]),
+            "net_end": NetworkTool.ip_from_id(ends[i]),
+            "ans_number": as_number,
+            "organization": as_description,
+            "country": country_code,
+        }
+
+    def _resolve(self, ip) -> Dict[str, Any]:
+        info = self._find_range(ip) or {}
+        readers = self.readers
+        for db in self.MMDB:
+            if db not in readers:
+                continue
+            reader = readers[db][1]
+            try:
+                if "ASN" in db:
+                    response_asn = reader.asn(ip)
+                    info.update(
+                        {
+                            "ans_number": response_asn.autonomous_system_number,
+                            "organization": response_asn.autonomous_system_organization,
+                        }
+                    )
+                if "City" in db:
+                    response_city = reader.city(ip)
+                    info.update(
+                        {
+                            "country": response_city.country.iso_code,
+                            "latitude": response_city.location.latitude,
+                            "longitude": response_city.location.longitude,
+                        }
+                    )
+            except Exception:
+                pass
+        return info
+
+    def lookup(self, ip) -> Dict[str, Any]:
+        return dict(self.cache.get_or_set(ip, self._resolve))
+
+    def lookup_many(self, ips: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {ip: dict(self.cache.get_or_set(ip, self._resolve)) for ip in ips}
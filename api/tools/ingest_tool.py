@@ -0,0 +1,225 @@
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from common_utils import LogCache, logger
+from tools.log_tool import LogParserTool
+from tools.tail_tool import LogTailer
+from config import APP_BASE, LOG_MERGE_INTERVAL, LOG_QUEUE_SIZE, LOG_PARSE_WORKERS
+
+
+class IngestPipeline:
+    """Shared log ingestion pipeline for all services.
+
+    Stages run in their own thread and are connected by bounded queues,
+    so a slow stage blocks the one before it instead of growing memory:
+
+        tail -> parse -> merge -> persist
+
+    Services are added and removed with sync_services, services kept
+    across reloads keep their cache and file positions. A removed
+    service is merged a last time once the lines it had queued are
+    parsed.
+
+    With parse_workers > 0 the JSON and user-agent parsing of each line
+    batch runs in a process pool, bounded to two batches in flight per
+    worker. Geo enrichment stays in this process, so the GeoIP table is
+    loaded once whatever the number of workers.
+    """
+
+    LOG_TYPES = {"access_log": "ACCESS", "error_log": "ERROR", "audit_log": "AUDIT"}
+
+    def __init__(self, log_dir=f"{APP_BASE}/logs", merge_interval=LOG_MERGE_INTERVAL, queue_size=LOG_QUEUE_SIZE,
+                 parse_workers=LOG_PARSE_WORKERS):
+        self.log_dir = log_dir
+        self.merge_interval = merge_interval
+        self.parse_workers = parse_workers
+        self.parse_pool = None
+        self.parse_slots = threading.Semaphore(max(parse_workers, 1) * 2)
+        self.tailer = LogTailer(log_dir)
+        self.parse_queue = queue.Queue(maxsize=queue_size)
+        self.persist_queue = queue.Queue(maxsize=queue_size)
+        self.caches = {}
+        self.removed = {}
+        self.retired = []
+        self.inflight = {}  # cache -> batches in the parse pool
+        self.closing = {}  # removed cache -> name, retired by its last pool batch
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.threads = []
+        self.active = False
+
+    def log_files(self, service_name):
+        return {
+            f"{self.log_dir}/{prefix}-{service_name}.log": log_type
+            for prefix, log_type in self.LOG_TYPES.items()
+        }
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        if self.parse_workers > 0:
+            self.parse_pool = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self.threads = [
+            threading.Thread(target=self._parse_loop, daemon=True),
+            threading.Thread(target=self._merge_loop, daemon=True),
+            threading.Thread(target=self._persist_loop, daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+        self.tailer.start()
+
+    def stop(self):
+        """Stop all stages after flushing what was already read."""
+        if not self.active:
+            return
+        self.sync_services([])
+        self.tailer.stop()
+        parse, merge, persist = self.threads
+        self.parse_queue.put(None)
+        parse.join()
+        self.active = False
+        self.wake.set()
+        merge.join()
+        persist.join()
+        self.threads = []
+
+    def sync_services(self, services):
+        """Follow the logs of the given services, dropping the ones not listed."""
+        names = {s["name"] for s in services}
+        with self.lock:
+            added = names - set(self.caches)
+            removed = set(self.caches) - names
+            for name in added:
+                self.caches[name] = LogCache()
+
+        for name in added:
+            for file_path, log_type in self.log_files(name).items():
+                self.tailer.register(file_path, partial(self._on_lines, name, log_type))
+        for name in removed:
+            for file_path in self.log_files(name):
+                self.tailer.unregister(file_path)
+            with self.lock:
+                cache = self.removed[name] = self.caches.pop(name)
+            # queued after the drained lines, retires the cache once they are parsed
+            self.parse_queue.put((name, None, cache))
+
+        if added or removed:
+            logger.info(f"[sync] services added {sorted(added)} removed {sorted(removed)}")
+
+    def _on_lines(self, name, log_type, lines):
+        self.parse_queue.put((name, log_type, lines))
+
+    def _parse_loop(self):
+        while True:
+            item = self.parse_queue.get()
+            if item is None:
+                break
+            name, log_type, lines = item
+            if log_type is None:
+                self._retire(name, lines)
+                continue
+            with self.lock:
+                cache = self.caches.get(name) or self.removed.get(name)
+            if not cache:
+                logger.warning(f"[{name}] Dropped {len(lines)} {log_type} lines of an unknown service")
+            elif self.parse_pool:
+                self._submit(name, cache, log_type, lines)
+            else:
+                self._parse(name, cache, log_type, lines)
+        if self.parse_pool:
+            self.parse_pool.shutdown(wait=True)
+            self.parse_pool = None
+        logger.debug(f"parse stage shutdown")
+
+    def _retire(self, name, cache):
+        """Hand a removed service cache over to its final merge, after its pool batches."""
+        with self.lock:
+            if self.removed.get(name) is cache:
+                del self.removed[name]
+            if self.inflight.get(cache):
+                self.closing[cache] = name
+                return
+            self.retired.append((name, cache))
+        self.wake.set()
+
+    def _settle(self, cache):
+        """Count a pool batch of cache as added, retiring the cache if it was the last one."""
+        with self.lock:
+            self.inflight[cache] -= 1
+            if self.inflight[cache]:
+                return
+            del self.inflight[cache]
+            name = self.closing.pop(cache, None)
+            if name is None:
+                return
+            self.retired.append((name, cache))
+        self.wake.set()
+
+    def _parse(self, name, cache, log_type, lines):
+        try:
+            LogParserTool.dispatch_lines(cache, log_type, lines)
+        except Exception as e:
+            logger.error(f"[{name}] Failed to parse {len(lines)} {log_type} lines, {e}")
+
+    def _submit(self, name, cache, log_type, lines):
+        def done(future):
+            self.parse_slots.release()
+            try:
+                records = future.result()
+                if log_type == "ACCESS":
+                    LogParserTool.add_geo(records)
+                LogParserTool.add_records(cache, log_type, records)
+            except Exception as e:
+                logger.error(f"[{name}] Failed to parse {len(lines)} {log_type} lines, {e}")
+            finally:
+                self._settle(cache)
+
+        self.parse_slots.acquire()
+        with self.lock:
+            self.inflight[cache] = self.inflight.get(cache, 0) + 1
+        try:
+            self.parse_pool.submit(LogParserTool.parse_lines, log_type, lines, geo=False).add_done_callback(done)
+        except Exception as e:
+            self.parse_slots.release()
+            self._settle(cache)
+            logger.error(f"Parse pool unavailable, parsing in pipeline thread: {e}")
+            self.parse_pool = None
+            self._parse(name, cache, log_type, lines)
+
+    def _merge_loop(self):
+        while True:
+            self.wake.wait(self.merge_interval)
+            self.wake.clear()
+            self.merge()
+            self.persist_queue.put(LogParserTool.tick_telemetry)
+            if not self.active:
+                break
+        self.persist_queue.put(None)
+        logger.debug(f"merge stage shutdown")
+
+    def merge(self):
+        with self.lock:
+            current = list(self.caches.items())
+            retired, self.retired = self.retired, []
+        for name, cache in current:
+            self.persist_queue.put(partial(LogParserTool.flush, name, LogParserTool.collect(cache)))
+        for name, cache in retired:
+            self.persist_queue.put(partial(LogParserTool.flush, name, LogParserTool.collect(cache, final=True)))
+
+    def _persist_loop(self):
+        while True:
+            task = self.persist_queue.get()
+            if task is None:
+                break
+            try:
+                task()
+            except Exception as e:
+                logger.error(f"Failed to persist log batch, {e}")
+        logger.debug(f"persist stage shutdown")
@@ -0,0 +1,154 @@
+import heapq
+import re
+import threading
+from datetime import datetime, timedelta
+
+from common_utils import hash_dict, logger, replace_tz
+from model.jail_model import JailDao
+from model.rbl_model import RBLDao
+
+
+class JailRules:
+    """Rules of a jail with their regexes compiled once."""
+
+    def __init__(self, rules):
+        self.headers, self.request_line, self.status_code = [], [], []
+        for rule in rules:
+            if "src.header" in rule["field"]:
+                self.headers.append(re.compile(rule["regex"], re.IGNORECASE))
+            if "src.request_line" in rule["field"]:
+                self.request_line.append(re.compile(rule["regex"]))
+            if "status_code" in rule["field"]:
+                self.status_code.append(re.compile(rule["regex"]))
+
+    def score(self, t) -> int:
+        """Number of rule hits of a transaction, every matching header counts."""
+        http = t.get("http") or {}
+        hits = 0
+        if self.headers:
+            contents = [h.get("content") or "" for h in (http.get("request") or {}).get("headers") or []]
+            for pattern in self.headers:
+                hits += sum(1 for c in contents if pattern.search(c))
+        if self.request_line:
+            line = http.get("request_line") or ""
+            hits += sum(1 for pattern in self.request_line if pattern.search(line))
+        if self.status_code:
+            status = str((http.get("response") or {}).get("status_code", ""))
+            hits += sum(1 for pattern in self.status_code if pattern.search(status))
+        return hits
+
+
+class JailWindow:
+    """Per source IP rule hits of a jail over its sliding interval.
+
+    Hits are kept in a heap by logtime so they decay as the interval moves.
+    An IP is reported once when its hits reach the jail occurrence and
+    again only after a full interval if it keeps offending.
+    """
+
+    def __init__(self, signature, jail):
+        self.signature = signature
+        self.jail = jail
+        self.rules = JailRules(jail["rules"])
+        self.interval = timedelta(minutes=jail["interval"])
+        self.events = []
+        self.counts = {}
+        self.banned = {}
+
+    def add(self, t, now):
+        """Count a transaction, returning its source IP if it has to be banned."""
+        score = self.rules.score(t)
+        ip = (t.get("source") or {}).get("ip")
+        if not score or not ip:
+            return None
+        heapq.heappush(self.events, (replace_tz(t["logtime"]), ip, score))
+        self.counts[ip] = self.counts.get(ip, 0) + score
+        if self.counts[ip] < self.jail["occurrence"]:
+            return None
+        last = self.banned.get(ip)
+        if last and now - last < self.interval:
+            return None
+        self.banned[ip] = now
+        return ip
+
+    def expire(self, now) -> None:
+        cutoff = now - self.interval
+        while self.events and self.events[0][0] < cutoff:
+            _, ip, score = heapq.heappop(self.events)
+            self.counts[ip] -= score
+            if self.counts[ip] <= 0:
+                del self.counts[ip]
+                self.banned.pop(ip, None)
+
+
+class JailTool:
+
+    lock = threading.Lock()
+    scn = None
+    windows = {}
+    sensor_jails = {}
+
+    @classmethod
+    def configure(cls, config):
+        """Compile the jails of an applied config, once per SCN.
+
+        Windows of jails whose definition did not change keep their counters.
+        """
+        if not config or config.get("scn") == cls.scn:
+            return
+        jails = {j["_id"]: j for j in config.get("jails", [])}
+        sensor_jails = {}
+        for s in config.get("sensors", []):
+            ids = [j["_id"] for j in s.get("jails") or [] if j and j["_id"] in jails]
+            if ids:
+                sensor_jails[str(s["_id"])] = ids
+        with cls.lock:
+            windows = {}
+            for jail_id, j in jails.items():
+                signature = hash_dict(j)
+                w = cls.windows.get(jail_id)
+                windows[jail_id] = w if w and w.signature == signature else JailWindow(signature, j)
+            cls.windows = windows
+            cls.sensor_jails = sensor_jails
+            cls.scn = config.get("scn")
+        logger.info(f"Jails compiled for scn {cls.scn}, {len(sensor_jails)} sensors")
+
+    @classmethod
+    def observe(cls, transactions) -> None:
+        """Evaluate merged transactions against their sensor jails and ban offenders."""
+        if not cls.sensor_jails:
+            return
+        now = replace_tz(datetime.now())
+        bans = {}
+        with cls.lock:
+            for w in cls.windows.values():
+                w.expire(now)
+            for t in transactions:
+                sensor_id = (t.get("sensor") or {}).get("_id")
+                for jail_id in cls.sensor_jails.get(str(sensor_id), []):
+                    w = cls.windows[jail_id]
+                    ip = w.add(t, now)
+                    if ip:
+                        bans.setdefault(jail_id, (w.jail, set()))[1].add(ip)
+        for jail, ips in bans.values():
+            try:
+                cls.ban(jail, ips, now)
+            except Exception as e:
+                logger.error(f"Failed to ban {len(ips)} addresses in jail {jail['name']}: {e}")
+
+    @classmethod
+    def ban(cls, jail, ips, now_dt) -> None:
+        rbl_dao = RBLDao()
+        rbl_dao.upsert_bans(jail["_id"], ips, now_dt, jail["bantime"])
+        rbl_dao.load_index(jail["_id"])
+        logger.info(f"Jail {jail['name']} banned {', '.join(sorted(ips))}")
+
+    @classmethod
+    def calc_process_jails(cls):
+        """Drop the bans past their bantime from the index.
+
+        Bans are removed from Mongo by the TTL index on 'expire_on'.
+        """
+        rbl_dao = RBLDao()
+        for j in JailDao().get_all()["data"]:
+            rbl_dao.load_index(j["_id"])
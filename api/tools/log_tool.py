@@ -1,6 +1,4 @@
 import json
-import threading
-import time
 import traceback
 from datetime import datetime
 
@@ -9,10 +7,11 @@ from ua_parser import user_agent_parser
 
 from config import APP_VERSION, DATETIME_FMT
 from model.config_model import ConfigDao
-from config import TELEMETRY_INTERVAL
-from common_utils import API_HEADERS, deep_merge, logger, get_server_id
-from model.transaction_model import TransactionDao
+from config import TELEMETRY_INTERVAL, LOG_MERGE_TTL, UA_CACHE_SIZE
+from common_utils import API_HEADERS, LRUCache, deep_merge, logger, get_server_id
+from model.transaction_model import TransactionDao, TransactionRollupDao, TransactionSummaryDao
 from tools.feed_tool import SecurityFeedTool
+from tools.jail_tool import JailTool
 from config import TZ
 
 
@@ -25,6 +24,8 @@ class LogParserTool:
         "c_interval": 0,
     }
 
+    agents = LRUCache(UA_CACHE_SIZE)
+
     @classmethod
     def parse_headers(cls, dto):
         headers = []
@@ -34,7 +35,7 @@ class LogParserTool:
         return headers
 
     @classmethod
-    def parse_agent(cls, user_agent):
+    def _parse_agent(cls, user_agent):
         r = user_agent_parser.Parse(user_agent)
         return {
             "family": r["user_agent"]["family"],
@@ -42,6 +43,11 @@ class LogParserTool:
             "minor": r["user_agent"]["minor"],
         }
 
+    @classmethod
+    def parse_agent(cls, user_agent):
+        """Parsed user agent, cached by the raw header (see agents.stats())."""
+        return dict(cls.agents.get_or_set(user_agent or "", cls._parse_agent))
+
     @classmethod
     def send_telemetry(cls,t):
         conf = ConfigDao().get_active()
@@ -68,87 +74,152 @@ class LogParserTool:
                 logger.error(f"Failed to send telemetry, {e}")
 
     @classmethod
-    def merge_transactions(cls, cache, tag):
-        setattr(threading.current_thread(), "active", True)
-        while getattr(threading.current_thread(), "active", False):
-            with cache.lock:
-                st_in = [
-                    len(cache.audit_log),
-                    len(cache.error_log),
-                    len(cache.access_log),
-                ]
-                model = TransactionDao()
-                for audit in cache.audit_log:
-                    for log in cache.access_log:
-                        if (
-                            log["server_id"] == audit["server_id"]
-                            and log["unique_id"] == audit["unique_id"]
-                        ):
-                            merged = deep_merge(log, audit)
-                            merged.update({"archived": False})
-                            log.update({"flushed": True})
-                            cls.telemetry["net_send"] += merged["http"]["response"]["bytes"] / 1048576.0 # MB
-                            cls.telemetry["net_recv"] += merged["http"]["request"]["bytes"] / 1048576.0 # MB
-                            model.persist(merged)
-                            break
-                cache.audit_log = []
-                cache.error_log = []
-                t_arr = []
-                for l in cache.access_log:
-                    if "flushed" not in l:
-                        t_arr.append(l)
-                cls.telemetry["req_total"] += (len(cache.access_log) - len(t_arr)) / 1000.0 # K requests
-                cache.access_log = t_arr
-                cls.telemetry["c_interval"] += 1
-                if cls.telemetry["c_interval"] >= TELEMETRY_INTERVAL:
-                    cls.send_telemetry(cls.telemetry.copy())
-                    cls.telemetry = {
-                        "net_recv": 0.0,
-                        "net_send": 0.0,
-                        "req_total": 0.0,
-                        "c_interval": 0,
-                    }
+    def summarize(cls, record):
+        http = record.get("http") or {}
+        request, response = http.get("request") or {}, http.get("response") or {}
+        summary = {
+            "logtime": record["logtime"],
+            "meta": {
+                "server_id": record.get("server_id"),
+                "service_id": (record.get("service") or {}).get("_id"),
+            },
+            "unique_id": record.get("unique_id"),
+            "action": record.get("action"),
+            "status": response.get("status_code"),
+            "bytes_in": request.get("bytes") or 0,
+            "bytes_out": response.get("bytes") or 0,
+            "duration": http.get("duration") or 0,
+        }
+        if "route_name" in record:
+            summary.update({"route_name": record["route_name"]})
+        if "sensor" in record:
+            summary.update({"sensor_id": record["sensor"]["_id"]})
+        if "upstream" in record:
+            summary.update({"upstream_id": record["upstream"]["_id"]})
+        return summary
 
-                logger.debug(
-                    f"[{tag}] - audit[{len(cache.audit_log)}/{st_in[0]}] error[{len(cache.error_log)}/{st_in[1]}] access[{len(cache.access_log)}/{st_in[2]}]"
-                )
+    @classmethod
+    def collect(cls, cache, final=False):
+        """Take the merge ready records out of a service cache."""
+        with cache.lock:
+            st_in = [
+                len(cache.audit_log),
+                len(cache.error_log),
+                len(cache.access_log),
+            ]
+            batch = {
+                "matches": cache.pop_matches(),
+                "expired": cache.expire(0 if final else LOG_MERGE_TTL),
+                "accesses": cache.access_summary,
+            }
+            cache.access_summary = []
+            cache.error_log = []
+            st_out = [
+                len(cache.audit_log),
+                len(cache.error_log),
+                len(cache.access_log),
+            ]
+        batch.update({"st_in": st_in, "st_out": st_out})
+        return batch
+
+    @classmethod
+    def flush(cls, tag, batch):
+        """Persist the summaries and merged transactions of a collected batch."""
+        # a record without logtime has no place in the time-series collection
+        summaries = [cls.summarize(r) for r in batch["accesses"] if r.get("logtime")]
+        for s in summaries:
+            cls.telemetry["net_send"] += s["bytes_out"] / 1048576.0 # MB
+            cls.telemetry["net_recv"] += s["bytes_in"] / 1048576.0 # MB
+        cls.telemetry["req_total"] += len(summaries) / 1000.0 # K requests
+        if summaries:
+            try:
+                TransactionSummaryDao().persist_batch(summaries)
+            except Exception as e:
+                logger.error(f"[{tag}] Failed to persist {len(summaries)} summaries, {e}")
+
+        transactions = []
+        for log, audit in batch["matches"]:
+            merged = deep_merge(log, audit)
+            merged.update({"archived": False})
+            transactions.append(merged)
+        batches = []
+        if transactions:
+            try:
+                JailTool.observe(transactions)
+            except Exception as e:
+                logger.error(f"[{tag}] Failed to evaluate jails, {e}")
+            try:
+                batches = TransactionDao().persist_batch(transactions)
+            except Exception as e:
+                logger.error(f"[{tag}] Failed to persist {len(transactions)} transactions, {e}")
+        if summaries or transactions:
+            try:
+                TransactionRollupDao().rollup(summaries, transactions)
+            except Exception as e:
+                logger.error(f"[{tag}] Failed to update rollups, {e}")
 
-            time.sleep(10)
-        logger.debug(f"merge_transactions shutdown")
+        st_in, st_out = batch["st_in"], batch["st_out"]
+        logger.debug(
+            f"[{tag}] - summary[{len(summaries)}] merged[{len(transactions)}] batches[{' '.join(str(b['latency']) + 'ms' for b in batches)}] expired[{len(batch['expired'])}] audit[{st_out[0]}/{st_in[0]}] error[{st_out[1]}/{st_in[1]}] access[{st_out[2]}/{st_in[2]}]"
+        )
 
     @classmethod
-    def follow_file(cls, cache, file_path, log_type):
-        with open(file_path, "w") as f:
-            f.write("init\n")
-        setattr(threading.current_thread(), "active", True)
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-                logger.debug(f"{file_path} for {log_type}")
-                file.seek(0, 2)
-                while getattr(threading.current_thread(), "active", False):
-                    line = file.readline()
-                    if not line:
-                        time.sleep(5)
-                        continue
-                    t = None
+    def tick_telemetry(cls):
+        cls.telemetry["c_interval"] += 1
+        if cls.telemetry["c_interval"] >= TELEMETRY_INTERVAL:
+            logger.debug(f"[telemetry] user agent cache {cls.agents.stats()}")
+            cls.send_telemetry(cls.telemetry.copy())
+            cls.telemetry = {
+                "net_recv": 0.0,
+                "net_send": 0.0,
+                "req_total": 0.0,
+                "c_interval": 0,
+            }
+
+    @classmethod
+    def dispatch_lines(cls, cache, log_type, lines):
+        cls.add_records(cache, log_type, cls.parse_lines(log_type, lines))
+
+    @classmethod
+    def parse_lines(cls, log_type, lines, geo=True):
+        """Parse raw log lines into merge ready records, safe to run in a worker process.
+
+        Worker processes pass geo=False and the records are enriched with
+        add_geo in the parent, which holds the only copy of the GeoIP table.
+        """
+        records = []
+        for line in lines:
+            t = None
+            if log_type == "ERROR":
+                t = cls.error_log(line)
+            if log_type == "ACCESS":
+                t = cls.access_log(line)
+            if log_type == "AUDIT":
+                t = cls.audit_log(line)
+            if t:
+                records.append(t)
+        if geo and log_type == "ACCESS":
+            cls.add_geo(records)
+        return records
+
+    @classmethod
+    def add_geo(cls, records):
+        """Set source.geo on parsed access records, one lookup per distinct address."""
+        geo = SecurityFeedTool.geo_info_many(list({t["source"]["ip"] for t in records}))
+        for t in records:
+            t["source"]["geo"] = geo[t["source"]["ip"]]
+
+    @classmethod
+    def add_records(cls, cache, log_type, records):
+        if records:
+            with cache.lock:
+                for t in records:
                     if log_type == "ERROR":
-                        t = cls.error_log(line)
+                        cache.error_log.append(t)
                     if log_type == "ACCESS":
-                        t = cls.access_log(line)
+                        cache.add_access(t)
                     if log_type == "AUDIT":
-                        t = cls.audit_log(line)
-                    if t:
-                        with cache.lock:
-                            if log_type == "ERROR":
-                                cache.error_log.append(t)
-                            if log_type == "ACCESS":
-                                cache.access_log.append(t)
-                            if log_type == "AUDIT":
-                                cache.audit_log.append(t)
-                logger.info(f"{file_path} shutdown")
-
-        except Exception as e:
-            logger.error(f"Read file error {file_path} {e}, retry")
+                        cache.add_audit(t)
 
     @classmethod
     def resolve_status_code(cls, code):
@@ -271,7 +342,6 @@ class LogParserTool:
                 "source": {
                     "ip": dto["remote_addr"],
                     "port": dto["remote_port"],
-                    "geo": SecurityFeedTool.geo_info(dto["remote_addr"]),
                 },
                 "destination": {"ip": "", "port": dto["server_port"]},
                 "http": {
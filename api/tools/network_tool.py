@@ -1,6 +1,6 @@
 import ipaddress
 import socket
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 from common_utils import logger
 
@@ -32,16 +32,87 @@ class NetworkTool:
             return None
 
     @classmethod
-    def id(cls, ip: str) -> str:
-        """Convert an IP address to its expanded form.
+    def id(cls, ip: str) -> Union[int, bytes]:
+        """Convert an IP address to its range key.
+        
+        IPv4 addresses are keyed by their integer value (stored as int64),
+        IPv6 addresses by their 16 packed bytes (stored as BinData). Both
+        keys sort in address order, so ``net_start``/``net_end`` range
+        queries are numeric/binary index scans.
         
         Args:
-            ip: IP address to expand
+            ip: IP address to convert
             
         Returns:
-            Expanded IP address as string
+            Integer key for IPv4, 16 byte key for IPv6
+        """
+        return cls.addr_id(ipaddress.ip_address(ip))
+
+    @classmethod
+    def addr_id(cls, addr: Union[ipaddress.IPv4Address, ipaddress.IPv6Address]) -> Union[int, bytes]:
+        """Range key of an already parsed address (see id)."""
+        if addr.version == 4:
+            return int(addr)
+        return addr.packed
+
+    @classmethod
+    def ip_from_id(cls, key: Union[int, bytes]) -> str:
+        """Convert a range key back to the IP address text.
+        
+        Args:
+            key: Key returned by id
+            
+        Returns:
+            IP address in compressed form
+        """
+        if isinstance(key, int):
+            return str(ipaddress.IPv4Address(key))
+        return str(ipaddress.IPv6Address(bytes(key)))
+
+    @classmethod
+    def id_int(cls, key: Union[int, bytes]) -> int:
+        """Numeric value of a range key, IPv6 keys included."""
+        if isinstance(key, int):
+            return key
+        return int.from_bytes(key, "big")
+
+    @classmethod
+    def merge_ranges(cls, ranges: Iterable[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
+        """Merge overlapping and adjacent (start, end) key ranges of one IP version.
+        
+        Sorting once and sweeping keeps it O(n log n), keys keep their type.
+        
+        Args:
+            ranges: Iterable of (net_start, net_end) keys as returned by id
+            
+        Returns:
+            Sorted list of disjoint, non adjacent (net_start, net_end) tuples
         """
-        return cls.expand_ip(ip)
+        merged = []
+        last_end = None
+        for start, end in sorted(ranges):
+            if merged and cls.id_int(start) <= last_end + 1:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+                    last_end = cls.id_int(end)
+                continue
+            merged.append([start, end])
+            last_end = cls.id_int(end)
+        return [(s, e) for s, e in merged]
+
+    @classmethod
+    def id_from_legacy(cls, key: str) -> Union[int, bytes]:
+        """Convert a key stored by the former expand_ip format.
+        
+        Args:
+            key: Zero-padded IPv4 or exploded IPv6 string
+            
+        Returns:
+            Range key as returned by id
+        """
+        if ":" in key:
+            return cls.id(key)
+        return cls.id(".".join(str(int(p)) for p in key.split(".")))
 
     @classmethod
     def is_host(cls, ip: str) -> bool:
@@ -87,14 +158,17 @@ class NetworkTool:
         Returns:
             List of aggregated network ranges
         """
-        nets = [ipaddress.ip_network(ip) for ip in addr_list]
-        nets = set(nets)
-        nets = sorted(nets, key=lambda n1: n1.prefixlen)
+        nets = sorted(
+            {ipaddress.ip_network(ip) for ip in addr_list},
+            key=lambda n: (n.version, n.network_address, n.prefixlen),
+        )
         uq_nets = []
-        while nets:
-            n = nets.pop(0)
-            if not any(n.subnet_of(un) for un in uq_nets):
-                uq_nets.append(n)
+        for n in nets:
+            # sorted by start, a network is covered only by the last kept one
+            last = uq_nets[-1] if uq_nets else None
+            if last and last.version == n.version and n.broadcast_address <= last.broadcast_address:
+                continue
+            uq_nets.append(n)
         return [str(r) for r in uq_nets]
 
     @classmethod
@@ -163,16 +237,11 @@ class NetworkTool:
 
     @classmethod
     def range_from_network(cls, net):
-        v = 6
-        if cls.is_ipv4(net):
-            v = 4
-            rede = ipaddress.IPv4Network(net, strict=False)
-        else:
-            rede = ipaddress.IPv6Network(net, strict=False)
+        rede = ipaddress.ip_network(net, strict=False)
         return {
-            "net_start": cls.id(str(rede.network_address)),
-            "net_end": cls.id(str(rede.broadcast_address)),
-            "version": v,
+            "net_start": cls.addr_id(rede.network_address),
+            "net_end": cls.addr_id(rede.broadcast_address),
+            "version": rede.version,
         }
 
     @classmethod
@@ -0,0 +1,164 @@
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import RBL_MERGED_VIEWS
+from tools.network_tool import NetworkTool
+
+
+class RBLIndex:
+    """In-memory lookup tables for RBL ranges.
+
+    Ranges are grouped per IP version, provider and action. Each group is
+    kept as two parallel sorted lists of disjoint ``net_start``/``net_end``
+    keys, so a lookup is a single binary search instead of a range query
+    against the ``rbl`` collection.
+
+    Keys are the ones returned by ``NetworkTool.id``.
+
+    With ``merged_views`` the tables of the providers a sensor uses are
+    merged into one view per (version, providers, action) on first use, so
+    a lookup is one binary search however many feeds the sensor has. A
+    provider reload only drops the views that include it, and none when its
+    ranges are unchanged. Jails change on every ban, so they are checked
+    table by table and kept out of the views.
+    """
+
+    def __init__(self, merged_views=RBL_MERGED_VIEWS):
+        self._lock = threading.Lock()
+        self._tables: Dict[Tuple[int, str, str], Tuple[List[Any], List[Any]]] = {}
+        self._views: Dict[Tuple[int, frozenset, str], Tuple[List[Any], List[Any]]] = {}
+        self.merged_views = merged_views
+        self.stamps: Dict[str, Any] = {}
+        self.ready = False
+
+    @classmethod
+    def merge_ranges(cls, ranges: Iterable[Tuple[Any, Any]]) -> Tuple[List[Any], List[Any]]:
+        """Merge overlapping and adjacent ranges into sorted disjoint start/end lists.
+
+        Args:
+            ranges: Iterable of (net_start, net_end) tuples
+
+        Returns:
+            Tuple with the sorted starts and their matching ends
+        """
+        merged = NetworkTool.merge_ranges(ranges)
+        return [s for s, _ in merged], [e for _, e in merged]
+
+    @classmethod
+    def collapse(cls, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge the ranges of a provider per IP version and action before storing them.
+
+        Args:
+            rows: Iterable of ranges (net_start, net_end, version, action)
+
+        Returns:
+            Merged ranges, sorted by version, action and net_start
+        """
+        groups = {}
+        for r in rows:
+            groups.setdefault((r["version"], r["action"]), []).append((r["net_start"], r["net_end"]))
+        collapsed = []
+        for (version, action), ranges in sorted(groups.items()):
+            for start, end in NetworkTool.merge_ranges(ranges):
+                collapsed.append({"net_start": start, "net_end": end, "version": version, "action": action})
+        return collapsed
+
+    @classmethod
+    def _group(cls, rows: Iterable[Dict[str, Any]]) -> Dict[Tuple[int, str, str], List[Tuple[Any, Any]]]:
+        groups = {}
+        for r in rows:
+            key = (r["version"], str(r["provider_id"]), r["action"])
+            groups.setdefault(key, []).append((r["net_start"], r["net_end"]))
+        return groups
+
+    def load(self, rows: Iterable[Dict[str, Any]], stamps: Optional[Dict[str, Any]] = None) -> int:
+        """Replace the whole index with the given rbl documents.
+
+        Args:
+            rows: Iterable of rbl documents (net_start, net_end, version, provider_id, action)
+            stamps: Optional provider_id -> update stamp mapping
+
+        Returns:
+            Number of disjoint ranges indexed
+        """
+        tables = {k: self.merge_ranges(v) for k, v in self._group(rows).items()}
+        with self._lock:
+            self._tables = tables
+            self._views = {}
+            self.stamps = dict(stamps or {})
+            self.ready = True
+        return sum(len(t[0]) for t in tables.values())
+
+    def load_provider(self, provider_id: str, rows: Iterable[Dict[str, Any]], stamp: Any = None) -> int:
+        """Replace the ranges of a single provider.
+
+        Args:
+            provider_id: Provider (feed or jail) id
+            rows: Iterable with all current rbl documents of the provider
+            stamp: Optional update stamp of the provider
+
+        Returns:
+            Number of disjoint ranges indexed for the provider
+        """
+        provider_id = str(provider_id)
+        fresh = {k: self.merge_ranges(v) for k, v in self._group(rows).items()}
+        with self._lock:
+            current = {k: v for k, v in self._tables.items() if k[1] == provider_id}
+            if current != fresh:
+                tables = {k: v for k, v in self._tables.items() if k[1] != provider_id}
+                tables.update(fresh)
+                self._tables = tables
+                self._views = {k: v for k, v in self._views.items() if provider_id not in k[1]}
+            if stamp is not None:
+                self.stamps[provider_id] = stamp
+        return sum(len(t[0]) for t in fresh.values())
+
+    @classmethod
+    def _search(cls, table, ip_id) -> bool:
+        if not table:
+            return False
+        starts, ends = table
+        i = bisect_right(starts, ip_id) - 1
+        return i >= 0 and ends[i] >= ip_id
+
+    def contains(self, version: int, provider_id: str, action: str, ip_id: Any) -> bool:
+        """Check if a provider has a range with the given action containing ip_id."""
+        return self._search(self._tables.get((version, str(provider_id), action)), ip_id)
+
+    def view(self, version: int, provider_ids: Iterable[str], action: str) -> Tuple[List[Any], List[Any]]:
+        """Merged table of the given providers, built on first use."""
+        providers = frozenset(str(p) for p in provider_ids)
+        key = (version, providers, action)
+        view = self._views.get(key)
+        if view is None:
+            parts = {p: self._tables.get((version, p, action)) for p in providers}
+            ranges = []
+            for starts, ends in filter(None, parts.values()):
+                ranges.extend(zip(starts, ends))
+            view = self.merge_ranges(ranges)
+            with self._lock:
+                # skip caching if one of the providers was reloaded meanwhile
+                if all(self._tables.get((version, p, action)) is t for p, t in parts.items()):
+                    self._views[key] = view
+        return view
+
+    def matches(self, version: int, provider_ids: Iterable[str], action: str, ip_id: Any) -> bool:
+        """Check if any of the providers has a range with the given action containing ip_id."""
+        if self.merged_views:
+            return self._search(self.view(version, provider_ids, action), ip_id)
+        return any(self.contains(version, p, action, ip_id) for p in provider_ids)
+
+    def is_blocked(
+        self, version: int, ip_id: Any, permit_ids: Iterable[str], deny_ids: Iterable[str], jail_ids: Iterable[str] = ()
+    ) -> bool:
+        """Evaluate an address against a sensor provider lists.
+
+        Any matching ``pass`` range in the permit providers wins over
+        ``deny`` ranges from the block and jail providers.
+        """
+        if self.matches(version, permit_ids, "pass", ip_id):
+            return False
+        if any(self.contains(version, j, "deny", ip_id) for j in jail_ids):
+            return True
+        return self.matches(version, deny_ids, "deny", ip_id)
@@ -0,0 +1,203 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+from common_utils import logger
+
+
+class Inotify:
+    """Minimal ctypes binding of the Linux inotify API."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read(self, timeout):
+        """Wait up to timeout seconds and return the (mask, name) of pending events."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        i = 0
+        while i + self._EVENT.size <= len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, i)
+            i += self._EVENT.size
+            name = data[i:i + length].rstrip(b"\0").decode("utf-8", errors="ignore")
+            i += length
+            events.append((mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TailedFile:
+    """Read position and partial line buffer of a followed log file."""
+
+    def __init__(self, path, handler):
+        self.path = path
+        self.handler = handler
+        self.file = None
+        self.inode = None
+        self.buffer = b""
+
+    def open(self, from_end=True):
+        self.close()
+        if not os.path.exists(self.path):
+            with open(self.path, "a"):
+                pass
+        self.file = open(self.path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.buffer = b""
+        if from_end:
+            self.file.seek(0, 2)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def read_lines(self):
+        """Return the complete lines written since the last read."""
+        if not self.file:
+            return []
+        chunk = self.file.read()
+        if not chunk:
+            return []
+        lines = (self.buffer + chunk).split(b"\n")
+        self.buffer = lines.pop()
+        return [l.decode("utf-8", errors="ignore") for l in lines if l.strip()]
+
+    def is_rotated(self):
+        """Check if the path was replaced (rotation/reopen) or truncated."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return st.st_ino != self.inode or st.st_size < self.file.tell()
+
+
+class LogTailer:
+    """Follow many log files of a directory from a single thread.
+
+    Changes are reported by inotify on the directory, so nginx reopening
+    (USR1) or rotated files are picked up from the new inode. Complete
+    lines are passed in batches to the handler of each file. Without
+    inotify support the files are polled every poll_interval seconds.
+    """
+
+    WATCH_MASK = Inotify.IN_MODIFY | Inotify.IN_CREATE | Inotify.IN_MOVED_TO | Inotify.IN_ATTRIB
+
+    def __init__(self, directory, poll_interval=1.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.files = {}
+        self.lock = threading.Lock()
+        self.active = False
+        self.thread = None
+        self.inotify = None
+
+    def register(self, path, handler):
+        """Follow path from its current end, calling handler(lines) for new lines."""
+        tailed = TailedFile(path, handler)
+        tailed.open(from_end=True)
+        with self.lock:
+            previous = self.files.get(os.path.basename(path))
+            self.files[os.path.basename(path)] = tailed
+        if previous:
+            previous.close()
+
+    def unregister(self, path):
+        """Stop following path, dispatching any line still pending."""
+        with self.lock:
+            tailed = self.files.pop(os.path.basename(path), None)
+        if tailed:
+            self._drain(tailed)
+            tailed.close()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        try:
+            self.inotify = Inotify()
+            self.inotify.add_watch(self.directory, self.WATCH_MASK)
+        except (OSError, AttributeError) as e:
+            logger.warn(f"inotify unavailable for {self.directory}, polling files: {e}")
+            self.inotify = None
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.active = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _drain(self, tailed):
+        try:
+            if tailed.is_rotated():
+                lines = tailed.read_lines()
+                tailed.open(from_end=False)
+                lines.extend(tailed.read_lines())
+            else:
+                lines = tailed.read_lines()
+            if lines:
+                tailed.handler(lines)
+        except Exception as e:
+            logger.error(f"Read file error {tailed.path} {e}")
+
+    def _drain_all(self, names=None):
+        with self.lock:
+            targets = [t for n, t in self.files.items() if names is None or n in names]
+        for tailed in targets:
+            self._drain(tailed)
+
+    def run(self):
+        inotify = self.inotify
+        last_scan = time.monotonic()
+        while self.active:
+            if inotify:
+                events = inotify.read(self.poll_interval)
+                if any(mask & Inotify.IN_Q_OVERFLOW for mask, _ in events):
+                    self._drain_all()
+                elif events:
+                    self._drain_all({name for _, name in events})
+                # periodic scan catches writes missed while a file was being rotated
+                if time.monotonic() - last_scan >= self.poll_interval * 10:
+                    self._drain_all()
+                    last_scan = time.monotonic()
+            else:
+                self._drain_all()
+                time.sleep(self.poll_interval)
+
+        if inotify:
+            inotify.close()
+            self.inotify = None
+        logger.info(f"{self.directory} tailer shutdown")
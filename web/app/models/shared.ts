@@ -46,6 +46,7 @@ export interface PageMeta {
     total_pages: number;
     per_page: number;
     page: number;
+    next?: string | null;
 }
 
 export interface Page {
@@ -44,7 +44,7 @@ export class TransactionService extends APIService<TransactionLog, number> {
         return this.httpClient.post<any>(this.END_POINT + '/stats/tpm', f);
     }
 
-    search(filter: TransactionFilter, pagination?: PageMeta): Observable<any> {
+    search(filter: TransactionFilter, pagination?: PageMeta, cursor?: string | null, count: boolean = false): Observable<any> {
         let f_list = []
         if (filter.filters)
             for (let i = 0; i < filter.filters.length; i++) {
@@ -59,8 +59,12 @@ export class TransactionService extends APIService<TransactionLog, number> {
             params: new HttpParams()
         }
         if (pagination) {
-            options.params = options.params.append("page", pagination.page);
+            // keyset pagination: size without page, 'cursor' is the 'next' of the previous page
             options.params = options.params.append("size", pagination.per_page);
+            if (cursor)
+                options.params = options.params.append("cursor", cursor);
+            if (count)
+                options.params = options.params.append("count", true);
         }
         return this.httpClient.post<any>(this.END_POINT, f, options);
     }
@@ -93,6 +93,7 @@ export class TransactionListComponent implements OnInit {
     transactionDC: string[] = ['logtime', 'score', 'source', 'service', 'request_line', 'duration', 'expand'];
     transactionDS: MatTableDataSource<TransactionLog>;
     transactionPA = new DefaultPageMeta();
+    transactionCursors: Array<string | null> = [null];
     transactions: Array<TransactionLog> = [];
     currentRowSelected: TransactionLog = {} as TransactionLog;
 
@@ -197,6 +198,12 @@ export class TransactionListComponent implements OnInit {
             row.isExpanded = false;
         } else {
             row.isExpanded = true;
+            // the search only returns list columns, headers and audit come with the full document
+            if (!row.isLoaded)
+                this.transactionService.getById(row._id).subscribe(trn => {
+                    Object.assign(row, trn);
+                    row.isLoaded = true;
+                });
         }
     }
 
@@ -221,11 +228,24 @@ export class TransactionListComponent implements OnInit {
             this.chart.update();
         });
 
-        this.transactionService.search(filter, this.transactionPA).subscribe(data => {
+        this.transactionCursors = [null];
+        this.transactionPA.page = 1;
+        this.loadPage();
+    }
+
+    loadPage() {
+        let filter = this.form.value as TransactionFilter;
+        const page = this.transactionPA.page;
+        this.transactionService.search(filter, this.transactionPA, this.transactionCursors[page - 1], page == 1).subscribe(data => {
             this.transactions = data.data;
             this.transactionDS.data = data.data;
             if (data.metadata) {
-                this.transactionPA = data.metadata;
+                this.transactionCursors[page] = data.metadata.next;
+                this.transactionPA = {
+                    ...this.transactionPA,
+                    per_page: data.metadata.per_page,
+                    total_elements: data.metadata.total_elements ?? this.transactionPA.total_elements,
+                };
             } else {
                 this.transactionPA = new DefaultPageMeta();
             }
@@ -233,9 +253,15 @@ export class TransactionListComponent implements OnInit {
     }
 
     nextPage(event: PageEvent) {
-        this.transactionPA.page = event.pageIndex + 1;
-        this.transactionPA.per_page = event.pageSize;
-        this.onSearch();
+        // only pages reached through a 'next' cursor can be loaded again
+        if (event.pageSize != this.transactionPA.per_page || (event.pageIndex > 0 && !this.transactionCursors[event.pageIndex])) {
+            this.transactionPA.per_page = event.pageSize;
+            this.transactionCursors = [null];
+            this.transactionPA.page = 1;
+        } else {
+            this.transactionPA.page = event.pageIndex + 1;
+        }
+        this.loadPage();
     }
 
     resolveClass(code: number) {